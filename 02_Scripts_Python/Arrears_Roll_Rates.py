@@ -0,0 +1,266 @@
+import pandas as pd
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from sqlalchemy.sql import text
+
+from db_connection import connect_or_exit
+
+# --- Configuration & Setup ---
+DATA_PATH = '04_Analysis_Outputs/'
+COUNTS_FILE = os.path.join(DATA_PATH, "Arrears_Transition_Counts.csv")   # Incremental store (long format)
+MATRIX_FILE = os.path.join(DATA_PATH, "Arrears_Roll_Rate_Matrix.csv")    # Latest roll-rate matrices
+SOURCE_TABLE = 'loansnapshot'
+
+# Arrears buckets: days_in_arrears < 1 -> Current, 1-5, 6-30, > 30
+BUCKET_EDGES = [1, 6, 31]
+BUCKET_LABELS = ['Current', '1-5 DPD', '6-30 DPD', '30+ DPD']
+N_BUCKETS = len(BUCKET_LABELS)
+
+FREQUENCIES = {'D': 'day-over-day', 'M': 'month-over-month'}
+CHUNK_SIZE = 500_000   # Rows per page pulled from MySQL
+N_WORKERS = os.cpu_count() or 1
+MAX_IN_FLIGHT = N_WORKERS * 2   # Chunks submitted but not yet counted (bounds memory)
+
+
+# --- 1. Transition Engine (pure NumPy, works on one customer-sorted chunk) ---
+
+def to_period(dates, freq):
+    """Maps datetime64 values to their period key (day or month) as datetime64."""
+    return dates.astype('datetime64[D]' if freq == 'D' else 'datetime64[M]')
+
+
+def count_transitions(customer_codes, dates, days_in_arrears, freq='D'):
+    """
+    Counts bucket-to-bucket transitions in a panel sorted by (customer, date).
+
+    For monthly frequency each customer's last observation in a month is used as the
+    month-end state. Returns (periods, counts) where counts[p, i, j] is the number of
+    customers moving from bucket i in the previous period to bucket j in periods[p].
+    """
+    periods = to_period(dates, freq)
+
+    if freq != 'D':
+        # Keep only the last row of each (customer, period) run
+        last_in_period = np.ones(len(periods), dtype=bool)
+        last_in_period[:-1] = (customer_codes[1:] != customer_codes[:-1]) | (periods[1:] != periods[:-1])
+        customer_codes = customer_codes[last_in_period]
+        periods = periods[last_in_period]
+        days_in_arrears = days_in_arrears[last_in_period]
+
+    buckets = np.digitize(days_in_arrears, BUCKET_EDGES)
+
+    # A transition exists between consecutive rows of the same customer only
+    same_customer = customer_codes[1:] == customer_codes[:-1]
+    from_bucket = buckets[:-1][same_customer]
+    to_bucket = buckets[1:][same_customer]
+    to_period_key = periods[1:][same_customer]
+
+    unique_periods, period_idx = np.unique(to_period_key, return_inverse=True)
+    cell_codes = (period_idx * N_BUCKETS + from_bucket) * N_BUCKETS + to_bucket
+    counts = np.bincount(cell_codes, minlength=len(unique_periods) * N_BUCKETS * N_BUCKETS)
+    return unique_periods, counts.reshape(len(unique_periods), N_BUCKETS, N_BUCKETS)
+
+
+def counts_to_frame(periods, counts, freq):
+    """Flattens a (period, from, to) count cube into the long store format."""
+    n_periods = len(periods)
+    return pd.DataFrame({
+        'frequency': freq,
+        'period': np.repeat(pd.to_datetime(periods).strftime('%Y-%m-%d'), N_BUCKETS * N_BUCKETS),
+        'from_bucket': np.tile(np.repeat(BUCKET_LABELS, N_BUCKETS), n_periods),
+        'to_bucket': np.tile(BUCKET_LABELS, N_BUCKETS * n_periods),
+        'transitions': counts.ravel(),
+    })
+
+
+def _process_chunk(args):
+    """Worker entry point: counts one chunk for every requested frequency."""
+    customer_ids, dates, days_in_arrears = args
+    customer_codes = pd.factorize(customer_ids)[0]
+    return [
+        counts_to_frame(*count_transitions(customer_codes, dates, days_in_arrears, freq), freq)
+        for freq in FREQUENCIES
+    ]
+
+
+def iter_panel_pages(conn, start_date=None):
+    """
+    Reads the panel in (customer_id, date) order, CHUNK_SIZE rows per query. Each page
+    resumes after the last key of the previous one (keyset paging on the loader's
+    (customer_id, date) index), so only one page is held in client memory even though
+    the MySQL driver buffers every result it fetches.
+    """
+    params = {'start_date': start_date} if start_date else {}
+    while True:
+        conditions = ["`date` >= :start_date"] if start_date else []
+        if 'last_id' in params:
+            conditions.append("(customer_id, `date`) > (:last_id, :last_date)")
+        where_clause = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        df_page = pd.read_sql(
+            text(
+                f"SELECT customer_id, `date`, days_in_arrears FROM {SOURCE_TABLE} "
+                f"{where_clause}ORDER BY customer_id, `date` LIMIT {CHUNK_SIZE}"
+            ),
+            conn, params=params
+        )
+        if len(df_page):
+            yield df_page
+        if len(df_page) < CHUNK_SIZE:
+            return
+        # The next page starts after this page's last key, bound as read (as Python scalars for the driver)
+        last_id, last_date = df_page.iloc[-1:][['customer_id', 'date']].to_numpy(dtype=object)[0].tolist()
+        if isinstance(last_date, pd.Timestamp):
+            last_date = last_date.to_pydatetime()
+        params.update(last_id=last_id, last_date=last_date)
+
+
+def iter_chunks(frames):
+    """
+    Yields customer-sorted chunks as NumPy arrays. The tail of the previous chunk
+    belonging to its last customer is carried over, so no transition (or month-end
+    state) is lost at a chunk boundary.
+    """
+    carry = None
+    for df_chunk in frames:
+        if carry is not None:
+            df_chunk = pd.concat([carry, df_chunk], ignore_index=True)
+        customer_ids = df_chunk['customer_id'].to_numpy()
+        # Rows of the chunk's last customer wait for the next chunk
+        other_rows = np.flatnonzero(customer_ids != customer_ids[-1])
+        tail_start = other_rows[-1] + 1 if len(other_rows) else 0
+        carry = df_chunk.iloc[tail_start:]
+        if tail_start:
+            yield _chunk_arrays(df_chunk.iloc[:tail_start])
+    if carry is not None and len(carry):
+        yield _chunk_arrays(carry)
+
+
+def _chunk_arrays(df_chunk):
+    """Column arrays handed to a worker process."""
+    return (
+        df_chunk['customer_id'].to_numpy(),
+        pd.to_datetime(df_chunk['date']).to_numpy(),
+        df_chunk['days_in_arrears'].to_numpy(),
+    )
+
+
+def count_chunks_bounded(executor, chunks):
+    """
+    Counts chunks on the pool with at most MAX_IN_FLIGHT submitted at once, so the
+    reader never runs ahead of the workers. Results are returned in chunk order.
+    """
+    results, pending = {}, {}
+    for position, chunk in enumerate(chunks):
+        if len(pending) >= MAX_IN_FLIGHT:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[pending.pop(future)] = future.result()
+        pending[executor.submit(_process_chunk, chunk)] = position
+    for future in wait(pending).done:
+        results[pending[future]] = future.result()
+    return [frame for position in sorted(results) for frame in results[position]]
+
+
+# --- 2. Incremental Store ---
+
+def load_store():
+    """Returns the persisted transition counts (empty frame on first run)."""
+    if os.path.exists(COUNTS_FILE):
+        return pd.read_csv(COUNTS_FILE)
+    return pd.DataFrame(columns=['frequency', 'period', 'from_bucket', 'to_bucket', 'transitions'])
+
+
+def history_start(store):
+    """
+    First date that must be read to extend the store: the last stored day (daily
+    transitions out of it) and the first day of the last stored month (its month-end
+    state). Before any month has closed, the month preceding the last stored day is
+    read instead. Returns None when nothing is stored yet (full history scan).
+    """
+    last_periods = store.groupby('frequency')['period'].max()
+    if 'D' not in last_periods:
+        return None
+    last_day = pd.Timestamp(last_periods['D'])
+    if 'M' in last_periods:
+        month_start = pd.Timestamp(last_periods['M'])
+    else:
+        month_start = last_day.replace(day=1) - pd.offsets.MonthBegin(1)
+    return min(last_day, month_start).date()
+
+
+def closed_new_rows(new_counts, store, max_date):
+    """
+    Keeps only periods that are complete and not yet stored. A day is complete once it
+    is loaded; a month is complete once data for a later month exists.
+    """
+    last_closed = {
+        'D': pd.Timestamp(max_date).strftime('%Y-%m-%d'),
+        'M': (pd.Timestamp(max_date).replace(day=1) - pd.offsets.MonthBegin(1)).strftime('%Y-%m-%d'),
+    }
+    last_stored = store.groupby('frequency')['period'].max().to_dict()
+    keep = np.zeros(len(new_counts), dtype=bool)
+    for freq in FREQUENCIES:
+        in_freq = new_counts['frequency'] == freq
+        keep |= in_freq & (new_counts['period'] <= last_closed[freq]) & (new_counts['period'] > last_stored.get(freq, ''))
+    return new_counts[keep]
+
+
+def roll_rate_matrices(store):
+    """Row-normalized roll-rate matrices for the latest stored period of each frequency."""
+    matrices = []
+    for freq, label in FREQUENCIES.items():
+        freq_rows = store[store['frequency'] == freq]
+        if freq_rows.empty:
+            continue
+        latest = freq_rows[freq_rows['period'] == freq_rows['period'].max()]
+        matrix = latest.pivot_table(
+            index='from_bucket', columns='to_bucket', values='transitions', aggfunc='sum'
+        ).reindex(index=BUCKET_LABELS, columns=BUCKET_LABELS, fill_value=0)
+        rates = matrix.div(matrix.sum(axis=1).replace(0, np.nan), axis=0).fillna(0.0).round(4)
+        rates.columns.name = None
+        rates = rates.reset_index()
+        rates.insert(0, 'period', latest['period'].iat[0])
+        rates.insert(0, 'frequency', label)
+        matrices.append(rates)
+    return pd.concat(matrices, ignore_index=True) if matrices else pd.DataFrame()
+
+
+# --- 3. Execution ---
+
+def main(engine=None):
+    """Appends the newly closed periods to the count store and rewrites the roll-rate matrices."""
+    if engine is None:
+        engine = connect_or_exit("roll-rate calculation")
+
+    store = load_store()
+    start_date = history_start(store)
+
+    with engine.connect() as conn:
+        max_date = conn.execute(text(f"SELECT MAX(`date`) FROM {SOURCE_TABLE}")).scalar()
+        print(f"Counting transitions from {start_date or 'the start of history'} to {max_date} "
+              f"with {N_WORKERS} worker(s)...")
+        # Pages are read lazily, as the bounded pool takes new chunks
+        with ProcessPoolExecutor(max_workers=N_WORKERS) as executor:
+            chunk_results = count_chunks_bounded(executor, iter_chunks(iter_panel_pages(conn, start_date)))
+
+    new_counts = pd.concat(chunk_results, ignore_index=True) if chunk_results else store.iloc[:0]
+    # A period may span two chunks, so sum per cell before appending
+    new_counts = new_counts.groupby(
+        ['frequency', 'period', 'from_bucket', 'to_bucket'], as_index=False, sort=False
+    )['transitions'].sum()
+    new_counts = closed_new_rows(new_counts, store, max_date)
+
+    # Only the newly closed periods are written; stored periods are never rewritten
+    new_counts.to_csv(COUNTS_FILE, mode='a', header=not os.path.exists(COUNTS_FILE), index=False)
+    print(f"Appended {new_counts['period'].nunique()} new period(s) to {COUNTS_FILE}")
+    store = pd.concat([store, new_counts], ignore_index=True)
+
+    df_matrix = roll_rate_matrices(store)
+    df_matrix.to_csv(MATRIX_FILE, index=False)
+    print(f"Roll-rate matrices saved to: {MATRIX_FILE}")
+    print(df_matrix)
+
+
+if __name__ == "__main__":
+    main()
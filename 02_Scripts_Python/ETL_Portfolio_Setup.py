@@ -1,12 +1,10 @@
 import pandas as pd
 import numpy as np
 import os
-from sqlalchemy import create_engine
 from dotenv import load_dotenv
-from urllib.parse import quote_plus
-from sqlalchemy.sql import text 
-# NEW: Import specific SQLAlchemy types for robust table creation
-from sqlalchemy import Integer, DECIMAL 
+from sqlalchemy.sql import text
+
+from db_connection import connect_or_exit
 
 # --- Configuration & Setup ---
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -16,92 +14,275 @@ DATA_PATH = '04_Analysis_Outputs/'
 SCORE_FILE = os.path.join(DATA_PATH, "Model_Scoring_Output.csv")
 LIMIT_FILE = os.path.join(DATA_PATH, "Credit_Limit_Recommendations.csv")
 DB_TABLE = 'CreditPortfolioMonitor'
+STAGING_TABLE = 'CreditPortfolioMonitor_staging'   # Sharded loads land here until every shard has succeeded
+
+# Snapshot date of this run (defaults to today; set SNAPSHOT_DATE=YYYY-MM-DD in .env to backfill)
+def current_snapshot_date(value=None):
+    """`value`, else SNAPSHOT_DATE from the environment, else today (re-read per run by the warm worker)."""
+    return pd.Timestamp(value or os.getenv('SNAPSHOT_DATE') or pd.Timestamp.today()).date()
+
+
+SNAPSHOT_DATE = current_snapshot_date()
+RETENTION_MONTHS = 24   # Monthly partitions older than this are dropped
+LOAD_BATCH_SIZE = 5000  # Rows per executemany round-trip
+
+# Keys for the per-customer simulated draws (hash_pandas_object needs 16-character keys)
+DPD_DRAW_KEY = 'monitor_dpd_0123'
+BALANCE_DRAW_KEY = 'monitor_bal_0123'
+
+
+def partition_name(snapshot_date):
+    """Monthly partition name, e.g. p202510 (sorts chronologically as a string)."""
+    return f"p{snapshot_date:%Y%m}"
+
+
+def partition_upper_bound(snapshot_date):
+    """First day of the following month, the exclusive upper bound of the partition."""
+    return (pd.Timestamp(snapshot_date) + pd.offsets.MonthBegin(1)).date().isoformat()
+
+
+def customer_uniform(customer_ids, hash_key):
+    """
+    Stable uniform [0, 1) draw per customer_id. Unlike a global np.random stream the
+    value depends only on the customer, so any subset (e.g. a shard) gets the same draws.
+    """
+    hashes = pd.util.hash_pandas_object(pd.Series(customer_ids), index=False, hash_key=hash_key).to_numpy()
+    return (hashes >> np.uint64(11)).astype(np.float64) / float(2 ** 53)
+
+
+def build_monitor_rows(df_scores, df_limits, snapshot_date=SNAPSHOT_DATE):
+    """Merges scores and limits and simulates the real-time status and financials."""
+    df_final = pd.merge(df_scores, df_limits, on='customer_id', how='inner')
+
+    # Simulate Loan Status based on actual_default and segment
+    df_final['loan_status'] = np.select(
+        [df_final['actual_default'] == 1, df_final['risk_segment'] == 'Prime'],
+        ['Default', 'Active'],
+        default='Settled'
+    )
+
+    # Simulate Days Past Due (DPD) - Correlated with risk (30 to 89 days for defaults)
+    df_final['days_past_due'] = np.where(
+        df_final['loan_status'] == 'Default',
+        30 + (customer_uniform(df_final['customer_id'], DPD_DRAW_KEY) * 60).astype(int),
+        0
+    )
+
+    # Simulate Outstanding Balance (10% to 80% of the limit for active loans)
+    df_final['outstanding_balance'] = np.where(
+        df_final['loan_status'] == 'Active',
+        df_final['recommended_limit'] * (0.1 + 0.7 * customer_uniform(df_final['customer_id'], BALANCE_DRAW_KEY)),
+        0
+    )
+    df_final['outstanding_balance'] = df_final['outstanding_balance'].round(2)
+
+    # Simplify P&L for monitoring (use the credit_score as a proxy for expected profitability)
+    df_final['expected_profit_loss'] = (df_final['credit_score'] / 700) * 1000 - 500
+    df_final['expected_profit_loss'] = df_final['expected_profit_loss'].round(2)
+
+    df_final.insert(0, 'snapshot_date', snapshot_date)
+    return df_final
+
+
+# The monitor table is a date-partitioned history: one row per (snapshot_date, customer_id),
+# one RANGE partition per calendar month. Reruns for the same day replace that day's rows,
+# and partitions older than the retention window are dropped instead of deleted row by row.
+MONITOR_COLUMNS_DDL = """
+    snapshot_date DATE NOT NULL,
+    customer_id VARCHAR(20) NOT NULL,
+    credit_score INT,
+    actual_default INT,
+    risk_segment VARCHAR(20),
+    recommended_limit INT,
+    loan_status VARCHAR(20),
+    days_past_due INT,
+    outstanding_balance DECIMAL(10, 2),
+    expected_profit_loss DECIMAL(10, 2),
+    PRIMARY KEY (snapshot_date, customer_id),
+    KEY idx_risk_segment (snapshot_date, risk_segment),
+    KEY idx_loan_status (snapshot_date, loan_status)
+"""
+CREATE_TABLE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {DB_TABLE} ({MONITOR_COLUMNS_DDL})
+PARTITION BY RANGE (TO_DAYS(snapshot_date)) (
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
+"""
+CREATE_STAGING_DDL = f"CREATE TABLE IF NOT EXISTS {STAGING_TABLE} ({MONITOR_COLUMNS_DDL});"
+
+
+def ensure_partition(conn, snapshot_date):
+    """Gives the snapshot month its own partition by splitting the partition that covers it."""
+    partitions = conn.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {'table': DB_TABLE}).all()
+    name = partition_name(snapshot_date)
+    upper_bound = partition_upper_bound(snapshot_date)
+    upper_days = conn.execute(text("SELECT TO_DAYS(:upper_bound)"), {'upper_bound': upper_bound}).scalar()
+
+    # PARTITION_DESCRIPTION holds each partition's TO_DAYS bound ('MAXVALUE' for p_future);
+    # the first bound above the month's upper bound belongs to the partition covering the month
+    for covering, bound in partitions:
+        if bound == 'MAXVALUE' or int(bound) > upper_days:
+            break
+        if covering == name or int(bound) == upper_days:
+            return
+    # New months split p_future; backfilled months split the older monthly partition that holds them
+    bound_sql = 'MAXVALUE' if bound == 'MAXVALUE' else f"({bound})"
+    conn.execute(text(
+        f"ALTER TABLE {DB_TABLE} REORGANIZE PARTITION {covering} INTO ("
+        f"PARTITION {name} VALUES LESS THAN (TO_DAYS('{upper_bound}')), "
+        f"PARTITION {covering} VALUES LESS THAN {bound_sql})"
+    ))
+    print(f"Created partition {name} in {DB_TABLE} (split from {covering}).")
+
 
-# MySQL connection details
-MYSQL_USER = os.getenv('MYSQL_USER')
-MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD')
-MYSQL_HOST = os.getenv('MYSQL_HOST')
-MYSQL_DATABASE = os.getenv('MYSQL_DATABASE')
-ENCODED_PASSWORD = quote_plus(MYSQL_PASSWORD)
-
-mysql_url = (
-    f'mysql+mysqlconnector://{MYSQL_USER}:{ENCODED_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}'
-)
-
-try:
-    engine = create_engine(mysql_url)
-    print("Connection established for database loading.")
-except Exception as e:
-    print(f"FATAL ERROR: Could not connect to MySQL: {e}")
-    exit()
-
-# --- 1. Load and Merge Data from Projects 1 and 2 ---
-df_scores = pd.read_csv(SCORE_FILE).rename(columns={'Is_High_Risk': 'actual_default'})
-df_limits = pd.read_csv(LIMIT_FILE)
-
-df_final = pd.merge(df_scores, df_limits, on='customer_id', how='inner')
-
-# --- 2. Transformation (Simulate Real-Time Status & Financials) ---
-np.random.seed(123) 
-
-# Simulate Loan Status based on actual_default and segment
-df_final['loan_status'] = np.select(
-    [df_final['actual_default'] == 1, df_final['risk_segment'] == 'Prime'],
-    ['Default', 'Active'],
-    default='Settled'
-)
-
-# Simulate Days Past Due (DPD) - Correlated with risk
-df_final['days_past_due'] = np.where(
-    df_final['loan_status'] == 'Default', 
-    np.random.randint(30, 90, len(df_final)), 
-    0
-)
-
-# Simulate Outstanding Balance
-df_final['outstanding_balance'] = np.where(
-    df_final['loan_status'] == 'Active', 
-    df_final['recommended_limit'] * np.random.uniform(0.1, 0.8, len(df_final)), 
-    0
-)
-df_final['outstanding_balance'] = df_final['outstanding_balance'].round(2)
-
-# Simplify P&L for monitoring (use the credit_score as a proxy for expected profitability)
-df_final['expected_profit_loss'] = (df_final['credit_score'] / 700) * 1000 - 500
-df_final['expected_profit_loss'] = df_final['expected_profit_loss'].round(2)
-
-
-# --- 3. Load (L) into MySQL Database ---
-
-try:
-    print(f"Loading {len(df_final)} records into {DB_TABLE}...")
-    
-    # FIX: Using imported SQLAlchemy type objects for robustness
-    df_final.to_sql(
-        DB_TABLE, 
-        con=engine, 
-        if_exists='replace', 
-        index=False,
-        dtype={
-            'credit_score': Integer, # Use SQLAlchemy Integer object
-            'actual_default': Integer,
-            'recommended_limit': Integer,
-            'days_past_due': Integer,
-            'outstanding_balance': DECIMAL(10, 2), # Use SQLAlchemy DECIMAL object
-            'expected_profit_loss': DECIMAL(10, 2)
-        }
+def retention_cutoff(snapshot_date):
+    """Oldest partition name kept when `snapshot_date` is the newest month held."""
+    return partition_name((pd.Timestamp(snapshot_date) - pd.DateOffset(months=RETENTION_MONTHS)).date())
+
+
+def check_retention(conn, snapshot_date):
+    """
+    Rejects a backfill older than the retention window of the newest month held: its
+    partition would be dropped on the next run and later rows would never expire.
+    """
+    newest = conn.execute(text(
+        "SELECT MAX(PARTITION_NAME) FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME <> 'p_future'"
+    ), {'table': DB_TABLE}).scalar()
+    if newest is None or partition_name(snapshot_date) >= newest:
+        return
+    cutoff = retention_cutoff(pd.Timestamp(f"{newest[1:]}01").date())
+    if partition_name(snapshot_date) < cutoff:
+        raise ValueError(
+            f"Snapshot {snapshot_date} is older than the {RETENTION_MONTHS}-month retention window "
+            f"of {DB_TABLE} (oldest month kept: {cutoff[1:5]}-{cutoff[5:]})."
+        )
+
+
+def drop_expired_partitions(conn, snapshot_date):
+    """Drops whole monthly partitions that fall outside the retention window."""
+    cutoff = retention_cutoff(snapshot_date)
+    expired = [
+        name for name in conn.execute(text(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+        ), {'table': DB_TABLE}).scalars()
+        if name != 'p_future' and name < cutoff
+    ]
+    if expired:
+        conn.execute(text(f"ALTER TABLE {DB_TABLE} DROP PARTITION {', '.join(expired)}"))
+        print(f"Dropped expired partitions: {', '.join(expired)}")
+
+
+def prepare_snapshot(engine, snapshot_date):
+    """Creates the tables and the partition for the snapshot (DDL only; the day's rows are replaced at load)."""
+    # DDL statements commit implicitly in MySQL, so partition maintenance runs on its own
+    with engine.begin() as conn:
+        check_retention(conn, snapshot_date)
+        # The pre-history table (rebuilt with if_exists='replace') has no snapshot_date and holds nothing to keep
+        legacy = conn.execute(text(
+            "SELECT COUNT(*) FROM information_schema.TABLES t "
+            "WHERE t.TABLE_SCHEMA = DATABASE() AND t.TABLE_NAME = :table AND NOT EXISTS ("
+            "SELECT 1 FROM information_schema.COLUMNS c WHERE c.TABLE_SCHEMA = t.TABLE_SCHEMA "
+            "AND c.TABLE_NAME = t.TABLE_NAME AND c.COLUMN_NAME = 'snapshot_date')"
+        ), {'table': DB_TABLE}).scalar()
+        if legacy:
+            conn.execute(text(f"DROP TABLE {DB_TABLE}"))
+            print(f"Dropped unpartitioned legacy {DB_TABLE} table.")
+        conn.execute(text(CREATE_TABLE_DDL))
+        conn.execute(text(CREATE_STAGING_DDL))
+        ensure_partition(conn, snapshot_date)
+        drop_expired_partitions(conn, snapshot_date)
+
+
+def _insert_rows(conn, table, df_final):
+    """Bulk path: batched executemany on the caller's transaction (autocommit stays off until commit)."""
+    columns = list(df_final.columns)
+    insert_sql = text(
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(':' + col for col in columns)})"
     )
-    print(f"SUCCESS: Data loaded into MySQL table '{DB_TABLE}'.")
+    records = df_final.astype(object).where(df_final.notna(), None).to_dict('records')
+    for start in range(0, len(records), LOAD_BATCH_SIZE):
+        conn.execute(insert_sql, records[start:start + LOAD_BATCH_SIZE])
+
+
+def load_snapshot(engine, df_final, snapshot_date):
+    """Replaces the day's rows in one transaction, so a failed load keeps the previous snapshot."""
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"DELETE FROM {DB_TABLE} WHERE snapshot_date = :snapshot_date"),
+            {'snapshot_date': snapshot_date}
+        )
+        _insert_rows(conn, DB_TABLE, df_final)
+
+
+# --- Sharded loads: each shard writes to the staging table; the day is published once all succeed ---
+
+def clear_staged_snapshot(engine, snapshot_date):
+    """Removes staged rows of the day (left over from a failed or abandoned sharded run)."""
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"DELETE FROM {STAGING_TABLE} WHERE snapshot_date = :snapshot_date"),
+            {'snapshot_date': snapshot_date}
+        )
+
 
-except Exception as e:
-    print(f"ERROR during data load: {e}")
-    
-# --- Final Check ---
-if engine:
+def stage_snapshot_rows(engine, df_final):
+    """One shard's rows into the staging table; not visible to monitoring queries yet."""
+    with engine.begin() as conn:
+        _insert_rows(conn, STAGING_TABLE, df_final)
+
+
+def publish_staged_snapshot(engine, snapshot_date):
+    """Swaps the staged day into the monitor table in one transaction; returns the row count."""
+    params = {'snapshot_date': snapshot_date}
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {DB_TABLE} WHERE snapshot_date = :snapshot_date"), params)
+        published = conn.execute(
+            text(f"INSERT INTO {DB_TABLE} SELECT * FROM {STAGING_TABLE} WHERE snapshot_date = :snapshot_date"), params
+        ).rowcount
+        conn.execute(text(f"DELETE FROM {STAGING_TABLE} WHERE snapshot_date = :snapshot_date"), params)
+    return published
+
+
+def main(engine=None, snapshot_date=SNAPSHOT_DATE):
+    """Builds the monitor rows for `snapshot_date` and replaces that day in the history table."""
+    if engine is None:
+        engine = connect_or_exit("database loading")
+
+    # --- 1. Load and Merge Data from Projects 1 and 2 ---
+    df_scores = pd.read_csv(SCORE_FILE).rename(columns={'Is_High_Risk': 'actual_default'})
+    df_limits = pd.read_csv(LIMIT_FILE)
+
+    # --- 2. Transformation (Simulate Real-Time Status & Financials) ---
+    df_final = build_monitor_rows(df_scores, df_limits, snapshot_date)
+
+    # --- 3. Load (L) into MySQL Database ---
+    try:
+        print(f"Loading {len(df_final)} records into {DB_TABLE} for snapshot {snapshot_date}...")
+        prepare_snapshot(engine, snapshot_date)
+        load_snapshot(engine, df_final, snapshot_date)
+        print(f"SUCCESS: Data loaded into MySQL table '{DB_TABLE}'.")
+
+    except Exception as e:
+        # Non-zero exit, so run_pipeline.ps1 and the warm worker stop here instead of at the dashboard
+        print(f"ERROR during data load: {e}")
+        exit(1)
+
+    # --- Final Check ---
     try:
         with engine.connect() as conn:
-            query = text(f"SELECT COUNT(*) FROM {DB_TABLE}")
-            count = conn.execute(query).scalar()
-            print(f"Verification: {count} records confirmed in the table.")
+            query = text(f"SELECT COUNT(*) FROM {DB_TABLE} WHERE snapshot_date = :snapshot_date")
+            count = conn.execute(query, {'snapshot_date': snapshot_date}).scalar()
+            print(f"Verification: {count} records confirmed in the table for snapshot {snapshot_date}.")
     except Exception as e:
-        print(f"ERROR during verification query: {e}")
\ No newline at end of file
+        print(f"ERROR during verification query: {e}")
+
+
+if __name__ == "__main__":
+    main()
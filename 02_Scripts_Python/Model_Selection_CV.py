@@ -0,0 +1,203 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import itertools
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+from Model_Training_V2_Scoring import (
+    load_training_data, with_cluster_features, build_model,
+    FEATURES, TARGET, CLUSTER_FEATURES, MODEL_CONFIG_FILE
+)
+
+# Suppress warnings for cleaner output (liblinear/lbfgs convergence on tiny folds)
+warnings.filterwarnings("ignore")
+
+# --- Configuration ---
+MODEL_OUTPUT_PATH = '04_Analysis_Outputs/'
+RESULTS_FILE = os.path.join(MODEL_OUTPUT_PATH, "Model_Selection_CV_Results.csv")
+FOLD_CACHE_DIR = os.path.join(MODEL_OUTPUT_PATH, "cv_cache")
+
+N_FOLDS = 5
+N_WORKERS = os.cpu_count() or 1
+
+# Candidate grid: feature sets x regularization strength x solver x standardization
+FEATURE_SETS = {
+    'repayment': FEATURES,
+    'repayment_arrears': FEATURES + ['max_days_in_arrears'],
+    'repayment_cluster': FEATURES + CLUSTER_FEATURES,
+    'cluster': CLUSTER_FEATURES,
+    'all': FEATURES + ['max_days_in_arrears'] + CLUSTER_FEATURES,
+}
+C_GRID = [0.01, 0.1, 1.0, 10.0, 100.0]
+SOLVERS = ['liblinear', 'lbfgs']
+STANDARDIZE = [False, True]
+
+# Is_High_Risk is defined as max_days_in_arrears > 5, so sets containing it are
+# reported for comparison but cannot be selected (the score would just restate the target)
+LEAKAGE_FEATURES = {'max_days_in_arrears'}
+# The cluster features are synthesized from a fixed seed, not observed, so any AUC they add is
+# noise fitted to this sample; they are also reported for comparison only
+SYNTHETIC_FEATURES = set(CLUSTER_FEATURES)
+
+
+# --- 1. Fold Cache (built once, memory-mapped by every worker) ---
+
+def build_fold_cache(df, columns, n_folds):
+    """Writes the candidate feature matrix, target and stratified fold ids as .npy files."""
+    from sklearn.model_selection import StratifiedKFold
+
+    os.makedirs(FOLD_CACHE_DIR, exist_ok=True)
+    X = df[columns].to_numpy(dtype=np.float64)
+    y = df[TARGET].to_numpy(dtype=np.int64)
+
+    fold_ids = np.empty(len(y), dtype=np.int64)
+    splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=42)
+    for fold, (_, test_idx) in enumerate(splitter.split(X, y)):
+        fold_ids[test_idx] = fold
+
+    np.save(os.path.join(FOLD_CACHE_DIR, "X.npy"), X)
+    np.save(os.path.join(FOLD_CACHE_DIR, "y.npy"), y)
+    np.save(os.path.join(FOLD_CACHE_DIR, "fold_ids.npy"), fold_ids)
+
+
+_cache = {}
+
+
+def _load_cache(columns):
+    """Per worker process: memory-maps the fold cache on first use."""
+    if not _cache:
+        _cache['X'] = np.load(os.path.join(FOLD_CACHE_DIR, "X.npy"), mmap_mode='r')
+        _cache['y'] = np.load(os.path.join(FOLD_CACHE_DIR, "y.npy"), mmap_mode='r')
+        _cache['fold_ids'] = np.load(os.path.join(FOLD_CACHE_DIR, "fold_ids.npy"), mmap_mode='r')
+        _cache['columns'] = {col: i for i, col in enumerate(columns)}
+    return _cache
+
+
+# --- 2. Candidate Evaluation ---
+
+def _fit_fold(task):
+    """Worker entry point: fits one candidate on one training fold, returns its held-out PDs."""
+    candidate_id, config, fold, columns = task
+    cache = _load_cache(columns)
+    col_idx = [cache['columns'][col] for col in config['features']]
+    test_mask = np.asarray(cache['fold_ids']) == fold
+
+    X = pd.DataFrame(np.asarray(cache['X'])[:, col_idx], columns=config['features'])
+    y = np.asarray(cache['y'])
+    model = build_model(config)
+    model.fit(X[~test_mask], y[~test_mask])
+    return candidate_id, np.flatnonzero(test_mask), model.predict_proba(X[test_mask])[:, 1]
+
+
+def ks_statistic(y, pd_scores):
+    """Kolmogorov-Smirnov: maximum separation between the bad and good cumulative distributions."""
+    from sklearn.metrics import roc_curve
+
+    fpr, tpr, _ = roc_curve(y, pd_scores)
+    return float(np.max(tpr - fpr))
+
+
+def candidate_grid():
+    return [
+        {'feature_set': name, 'features': features, 'C': C, 'solver': solver, 'standardize': standardize}
+        for (name, features), C, solver, standardize
+        in itertools.product(FEATURE_SETS.items(), C_GRID, SOLVERS, STANDARDIZE)
+    ]
+
+
+def run_model_selection(df):
+    """Evaluates every candidate with stratified k-fold CV in parallel; returns the results table."""
+    from sklearn.metrics import roc_auc_score
+
+    columns = list(dict.fromkeys(col for features in FEATURE_SETS.values() for col in features))
+    # Each fold needs at least one high-risk customer, and CV needs two folds
+    class_counts = df[TARGET].value_counts()
+    if len(class_counts) < 2 or class_counts.min() < 2:
+        print(f"ERROR: Cross-validation needs at least 2 customers in each {TARGET} class; "
+              f"found {class_counts.to_dict()}.")
+        exit()
+    n_folds = int(min(N_FOLDS, class_counts.min()))
+    build_fold_cache(df, columns, n_folds)
+
+    candidates = candidate_grid()
+    tasks = [(i, config, fold, columns) for i, config in enumerate(candidates) for fold in range(n_folds)]
+    y = df[TARGET].to_numpy()
+    oof_pd = np.zeros((len(candidates), len(y)))
+    with ProcessPoolExecutor(max_workers=N_WORKERS) as executor:
+        for candidate_id, test_idx, fold_pd in executor.map(_fit_fold, tasks, chunksize=max(1, len(tasks) // (4 * N_WORKERS))):
+            oof_pd[candidate_id, test_idx] = fold_pd
+
+    fold_ids = np.load(os.path.join(FOLD_CACHE_DIR, "fold_ids.npy"))
+    results = []
+    for i, config in enumerate(candidates):
+        auc = roc_auc_score(y, oof_pd[i])
+        fold_auc = [roc_auc_score(y[fold_ids == fold], oof_pd[i, fold_ids == fold]) for fold in range(n_folds)]
+        results.append({
+            'feature_set': config['feature_set'],
+            'C': config['C'],
+            'solver': config['solver'],
+            'standardize': config['standardize'],
+            'n_features': len(config['features']),
+            'AUC': round(auc, 4),
+            'KS': round(ks_statistic(y, oof_pd[i]), 4),
+            'Gini': round(2 * auc - 1, 4),
+            # Standard error of the mean fold AUC, for the one-standard-error rule
+            'AUC_SE': round(float(np.std(fold_auc, ddof=1) / np.sqrt(n_folds)), 4),
+            'eligible': not (set(config['features']) & (LEAKAGE_FEATURES | SYNTHETIC_FEATURES)),
+        })
+    # Best first; ties prefer higher KS, fewer features and stronger regularization
+    df_results = pd.DataFrame(results).sort_values(
+        ['eligible', 'AUC', 'KS', 'n_features', 'C'], ascending=[False, False, False, True, True]
+    ).reset_index(drop=True)
+    return df_results, n_folds
+
+
+def select_candidate(df_results):
+    """
+    One-standard-error rule: among eligible candidates whose AUC is within one standard
+    error of the best, picks the simplest (fewest features, then strongest regularization).
+    """
+    eligible = df_results[df_results['eligible']]
+    if eligible.empty:
+        print("ERROR: No eligible candidate (every feature set contains leakage or synthetic features).")
+        exit()
+    best = eligible.iloc[0]
+    within_one_se = eligible[eligible['AUC'] >= best['AUC'] - best['AUC_SE']]
+    return within_one_se.sort_values(['n_features', 'C', 'AUC'], ascending=[True, True, False]).iloc[0]
+
+
+def main(df_merged=None):
+    """Cross-validates the candidate configurations and saves the winner."""
+    if df_merged is None:
+        df_merged = load_training_data()
+    df_merged = with_cluster_features(df_merged)
+
+    print(f"--- Cross-Validated Model Selection ({len(candidate_grid())} candidates, {N_WORKERS} workers) ---")
+    df_results, n_folds = run_model_selection(df_merged)
+    df_results.to_csv(RESULTS_FILE, index=False)
+    print(f"{n_folds}-fold CV results saved to: {RESULTS_FILE}")
+
+    # Feed the winning configuration to Model_Training_V2_Scoring.py
+    best = select_candidate(df_results)
+    best_config = {
+        'features': FEATURE_SETS[best['feature_set']],
+        'C': float(best['C']),
+        'solver': best['solver'],
+        'standardize': bool(best['standardize']),
+    }
+    with open(MODEL_CONFIG_FILE, 'w') as f:
+        json.dump(best_config, f, indent=2)
+
+    print("\nTop Candidates:")
+    print(df_results.head(10))
+    print(f"\nWinning configuration saved to: {MODEL_CONFIG_FILE}")
+    print(f"**Feature Set:** {best['feature_set']} | C={best['C']} | solver={best['solver']} | standardize={best['standardize']}")
+    print(f"**CV AUC:** {best['AUC']} (best eligible {df_results[df_results['eligible']]['AUC'].iat[0]}, "
+          f"one-standard-error rule) | **KS:** {best['KS']} | **Gini:** {best['Gini']}")
+    return best_config
+
+
+if __name__ == "__main__":
+    main()
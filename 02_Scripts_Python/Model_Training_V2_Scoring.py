@@ -1,10 +1,8 @@
 import pandas as pd
-from sklearn.linear_model import LogisticRegression
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 import warnings
 import os
+import json
 
 # Suppress warnings for cleaner output
 warnings.filterwarnings("ignore", category=FutureWarning)
@@ -15,89 +13,180 @@ DATA_PATH = '04_Analysis_Outputs/'
 MODEL_OUTPUT_PATH = '04_Analysis_Outputs/' 
 OUTPUT_SCORE_FILE = os.path.join(MODEL_OUTPUT_PATH, "Model_Scoring_Output.csv") # NEW OUTPUT FILE
 
-# NOTE: The merged file was created in a previous step, adjust path if necessary.
-try:
-	df_merged = pd.read_csv(os.path.join(DATA_PATH, "ML_Credit_Risk_Data.csv"))
-except FileNotFoundError:
-	# Fallback plan if ML_Credit_Risk_Data.csv isn't found
-	df_agg = pd.read_csv(os.path.join(DATA_PATH, "Aggregation, Total Cumulative Repayment and Interest at Final Day.csv"))
-	df_arrears = pd.read_csv(os.path.join(DATA_PATH, "Arrears Tracking, Maximum Days in Arrears Observed.csv"))
-	df_merged = pd.merge(df_agg, df_arrears, on='customer_id')
-	# Target: 1 if max_days_in_arrears > 5 (High Risk), 0 otherwise
-	df_merged['Is_High_Risk'] = np.where(df_merged['max_days_in_arrears'] > 5, 1, 0)
-	df_merged.to_csv(os.path.join(MODEL_OUTPUT_PATH, "ML_Credit_Risk_Data.csv"), index=False)
-
-
-# 1. Define Features and Target
-features = ['cumulative_repayment', 'cumulative_interest']
-X = df_merged[features]
-y = df_merged['Is_High_Risk']
-
-# 2. Train the Logistic Regression Model
-# Logistic Regression is a standard, interpretable credit risk model
-model = LogisticRegression(solver='liblinear', random_state=42)
-model.fit(X, y)
-
-# 2a. --- NEW: Generate Probability of Default (PD) and Credit Score ---
-# Predict the probability of the 'High Risk' class (1)
-df_merged['probability_default'] = model.predict_proba(X)[:, 1] 
+TRAINING_DATA_FILE = os.path.join(DATA_PATH, "ML_Credit_Risk_Data.csv")
+MODEL_CONFIG_FILE = os.path.join(MODEL_OUTPUT_PATH, "Model_Selection_Best_Config.json") # Written by Model_Selection_CV.py
+
+FEATURES = ['cumulative_repayment', 'cumulative_interest']
+TARGET = 'Is_High_Risk'
+# Synthesized customer features from Credit_Limit_Clustering.py (its synthetic max_days_in_arrears is not used)
+CLUSTER_FEATURES = ['avg_monthly_net_income', 'income_volatility', 'avg_min_daily_balance', 'prior_loan_count']
+DEFAULT_MODEL_CONFIG = {'features': FEATURES, 'C': 1.0, 'solver': 'liblinear', 'standardize': False}
+OUTPUT_FEATURES = ['customer_id', 'credit_score', 'Is_High_Risk']
 
 # Apply a standard FICO-like transformation: Score = Offset + Factor * log( (1-PD) / PD )
 BASE_SCORE = 600
 PDO = 40 # Points to Double the Odds
 FACTOR = PDO / np.log(2) 
 
-# Calculate the odds (Odds = PD / (1 - PD))
-odds_ratio = df_merged['probability_default'].mean() / (1 - df_merged['probability_default'].mean())
-
-# Calculate the offset
-OFFSET = BASE_SCORE + FACTOR * np.log(odds_ratio)
-
-# Calculate the final score
-df_merged['credit_score'] = OFFSET + FACTOR * np.log((1 - df_merged['probability_default']) / df_merged['probability_default'])
-# Ensure score is an integer
-df_merged['credit_score'] = df_merged['credit_score'].round().astype(int) 
-
-# Save the model output for the next step (P&L Optimization)
-output_features = ['customer_id', 'credit_score', 'Is_High_Risk']
-df_merged[output_features].to_csv(OUTPUT_SCORE_FILE, index=False)
-# 2b. -------------------------------------------------------------------
-
-
-# 3. Extract and analyze Coefficients for Explainability
-coefficients = model.coef_[0]
-intercept = model.intercept_[0]
-
-# Create a DataFrame for Model Explainability
-feature_importance = pd.DataFrame({
-	'Feature': features,
-	'Coefficient': coefficients,
-	'Abs_Coefficient': np.abs(coefficients) # Absolute value shows magnitude of importance
-}).sort_values(by='Abs_Coefficient', ascending=False).reset_index(drop=True)
-
-# 4. Generate a Feature Importance Bar Plot (based on coefficient magnitude)
-plt.figure(figsize=(8, 5))
-sns.barplot(
-	x='Abs_Coefficient', 
-	y='Feature', 
-	data=feature_importance, 
-	palette='magma'
-)
-plt.title('Feature Importance (Logistic Regression Coefficients)', fontsize=14)
-plt.xlabel('Absolute Coefficient Value', fontsize=12)
-plt.ylabel('Feature', fontsize=12)
-plt.tight_layout()
-plt.savefig(os.path.join(MODEL_OUTPUT_PATH, "ML_Coefficient_Feature_Importance.png"))
-plt.close()
-
-# 5. Save the coefficients table for documentation
-feature_importance_output = feature_importance[['Feature', 'Coefficient']].copy()
-feature_importance_output.to_csv(os.path.join(MODEL_OUTPUT_PATH, "ML_Model_Coefficients.csv"), index=False)
-
-print("--- ML Step Complete (Model Training & Explainability) ---")
-print(f"Model Intercept (Bias): {intercept:.4f}")
-print("Coefficients Table saved as 04_Analysis_Outputs/ML_Model_Coefficients.csv")
-print("Feature Importance Plot saved as 04_Analysis_Outputs/ML_Coefficient_Feature_Importance.png")
-print(f"--- NEW: Model Scores saved as {OUTPUT_SCORE_FILE} for P&L Optimization ---")
-print("\nCoefficient Analysis:")
-print(feature_importance_output)
\ No newline at end of file
+
+def load_training_data():
+	"""Loads the ML feature table, rebuilding it from the SQL outputs if necessary."""
+	# NOTE: The merged file was created in a previous step, adjust path if necessary.
+	try:
+		df_merged = pd.read_csv(TRAINING_DATA_FILE)
+	except FileNotFoundError:
+		# Fallback plan if ML_Credit_Risk_Data.csv isn't found
+		df_agg = pd.read_csv(os.path.join(DATA_PATH, "Aggregation, Total Cumulative Repayment and Interest at Final Day.csv"))
+		df_arrears = pd.read_csv(os.path.join(DATA_PATH, "Arrears Tracking, Maximum Days in Arrears Observed.csv"))
+		df_merged = pd.merge(df_agg, df_arrears, on='customer_id')
+		# Target: 1 if max_days_in_arrears > 5 (High Risk), 0 otherwise
+		df_merged['Is_High_Risk'] = np.where(df_merged['max_days_in_arrears'] > 5, 1, 0)
+		df_merged.to_csv(os.path.join(MODEL_OUTPUT_PATH, "ML_Credit_Risk_Data.csv"), index=False)
+	return df_merged
+
+
+def load_model_config():
+	"""The configuration chosen by cross-validated model selection, or the default model."""
+	try:
+		with open(MODEL_CONFIG_FILE) as f:
+			return json.load(f)
+	except FileNotFoundError:
+		return DEFAULT_MODEL_CONFIG
+
+
+def with_cluster_features(df_merged):
+	"""Joins the synthesized clustering features onto the training table."""
+	# Imported here: the clustering module is only needed when a model uses its features
+	from Credit_Limit_Clustering import synthesize_features
+	df_cluster = synthesize_features(df_merged[['customer_id']])
+	return df_merged.join(df_cluster[CLUSTER_FEATURES])
+
+
+def prepare_training_data(config, df_merged=None):
+	"""Training table with the columns the configuration needs (loaded unless given)."""
+	if df_merged is None:
+		df_merged = load_training_data()
+	if set(config['features']) & set(CLUSTER_FEATURES):
+		df_merged = with_cluster_features(df_merged)
+	return df_merged
+
+
+def build_model(config):
+	"""Unfitted Logistic Regression for a model configuration."""
+	# Imported here (as is plotting below) so importing this module stays cheap
+	from sklearn.linear_model import LogisticRegression
+	from sklearn.pipeline import make_pipeline
+	from sklearn.preprocessing import StandardScaler
+
+	# Logistic Regression is a standard, interpretable credit risk model
+	model = LogisticRegression(C=config['C'], solver=config['solver'], random_state=42)
+	return make_pipeline(StandardScaler(), model) if config['standardize'] else model
+
+
+def fit_scoring_model(df_merged, config=DEFAULT_MODEL_CONFIG):
+	"""
+	Trains the Logistic Regression model and derives the score offset.
+	The offset anchors the portfolio-average odds at BASE_SCORE, so it is fitted
+	once on the whole population and then reused for every customer (or shard).
+	"""
+	features = config['features']
+	model = build_model(config)
+	model.fit(df_merged[features], df_merged[TARGET])
+
+	# Calculate the odds (Odds = PD / (1 - PD))
+	probability_default = model.predict_proba(df_merged[features])[:, 1]
+	odds_ratio = probability_default.mean() / (1 - probability_default.mean())
+
+	# Calculate the offset
+	offset = BASE_SCORE + FACTOR * np.log(odds_ratio)
+	return model, offset
+
+
+def score_customers(df, model, offset):
+	"""Per-customer step: adds probability_default and the integer credit_score."""
+	df = df.copy()
+	# Predict the probability of the 'High Risk' class (1)
+	df['probability_default'] = model.predict_proba(df[list(model.feature_names_in_)])[:, 1] 
+
+	# Calculate the final score
+	df['credit_score'] = offset + FACTOR * np.log((1 - df['probability_default']) / df['probability_default'])
+	# Ensure score is an integer
+	df['credit_score'] = df['credit_score'].round().astype(int) 
+	return df
+
+
+def plot_feature_importance(feature_importance):
+	"""Feature Importance Bar Plot (based on coefficient magnitude)."""
+	import matplotlib.pyplot as plt
+	import seaborn as sns
+
+	plt.figure(figsize=(8, 5))
+	sns.barplot(
+		x='Abs_Coefficient', 
+		y='Feature', 
+		data=feature_importance, 
+		palette='magma'
+	)
+	plt.title('Feature Importance (Logistic Regression Coefficients)', fontsize=14)
+	plt.xlabel('Absolute Coefficient Value', fontsize=12)
+	plt.ylabel('Feature', fontsize=12)
+	plt.tight_layout()
+	plt.savefig(os.path.join(MODEL_OUTPUT_PATH, "ML_Coefficient_Feature_Importance.png"))
+	plt.close()
+
+
+def main(config=None, df_merged=None, fitted=None):
+	"""
+	Scores the portfolio with the selected configuration; anything not passed in is loaded
+	or fitted here. Returns the fitted (model, offset).
+	"""
+	# 1. Define Features and Target (winning configuration from Model_Selection_CV.py, if available)
+	if config is None:
+		config = load_model_config()
+	if df_merged is None:
+		df_merged = prepare_training_data(config)
+	features = config['features']
+	print(f"Model configuration: {config}")
+
+	# 2. Train the Logistic Regression Model
+	model, OFFSET = fitted if fitted is not None else fit_scoring_model(df_merged, config)
+
+	# 2a. --- NEW: Generate Probability of Default (PD) and Credit Score ---
+	df_merged = score_customers(df_merged, model, OFFSET)
+
+	# Save the model output for the next step (P&L Optimization)
+	df_merged[OUTPUT_FEATURES].to_csv(OUTPUT_SCORE_FILE, index=False)
+	# 2b. -------------------------------------------------------------------
+
+
+	# 3. Extract and analyze Coefficients for Explainability
+	# (coefficients are on the standardized scale when the configuration standardizes)
+	coefficients = model[-1].coef_[0] if config['standardize'] else model.coef_[0]
+	intercept = model[-1].intercept_[0] if config['standardize'] else model.intercept_[0]
+
+	# Create a DataFrame for Model Explainability
+	feature_importance = pd.DataFrame({
+		'Feature': features,
+		'Coefficient': coefficients,
+		'Abs_Coefficient': np.abs(coefficients) # Absolute value shows magnitude of importance
+	}).sort_values(by='Abs_Coefficient', ascending=False).reset_index(drop=True)
+
+	# 4. Generate a Feature Importance Bar Plot (based on coefficient magnitude)
+	plot_feature_importance(feature_importance)
+
+	# 5. Save the coefficients table for documentation
+	feature_importance_output = feature_importance[['Feature', 'Coefficient']].copy()
+	feature_importance_output.to_csv(os.path.join(MODEL_OUTPUT_PATH, "ML_Model_Coefficients.csv"), index=False)
+
+	print("--- ML Step Complete (Model Training & Explainability) ---")
+	print(f"Model Intercept (Bias): {intercept:.4f}")
+	print("Coefficients Table saved as 04_Analysis_Outputs/ML_Model_Coefficients.csv")
+	print("Feature Importance Plot saved as 04_Analysis_Outputs/ML_Coefficient_Feature_Importance.png")
+	print(f"--- NEW: Model Scores saved as {OUTPUT_SCORE_FILE} for P&L Optimization ---")
+	print("\nCoefficient Analysis:")
+	print(feature_importance_output)
+	return model, OFFSET
+
+
+if __name__ == "__main__":
+	main()
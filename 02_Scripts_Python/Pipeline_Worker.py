@@ -0,0 +1,374 @@
+import os
+import sys
+import io
+import csv
+import time
+import hashlib
+import traceback
+import importlib
+import contextlib
+import subprocess
+from multiprocessing.connection import Listener, Client
+from dotenv import load_dotenv
+
+# Only the standard library and dotenv are imported here: the client side of this script
+# starts in well under a second. pandas, sklearn and plotting load once, in the worker.
+
+# --- Configuration ---
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPTS_DIR)
+VIZ_DIR = os.path.join(PROJECT_ROOT, '05_Visualizations_Python')
+load_dotenv(os.path.join(PROJECT_ROOT, '.env'))
+
+# The worker only listens on localhost. Requests are unpickled, so the key must be a private
+# value from .env (PIPELINE_WORKER_KEY); there is deliberately no default.
+WORKER_ADDRESS = ('127.0.0.1', int(os.getenv('PIPELINE_WORKER_PORT') or 6061))
+WORKER_AUTHKEY = os.getenv('PIPELINE_WORKER_KEY', '').encode()
+POOL_RECYCLE_SECONDS = 3600   # Below MySQL's default wait_timeout (8h), so idle pooled connections stay valid
+START_TIMEOUT_SECONDS = 60
+BENCHMARK_FILE = os.path.join(PROJECT_ROOT, '04_Analysis_Outputs', 'Worker_Startup_Benchmark.csv')
+
+# Stage name -> (module, script); same order as run_pipeline.ps1
+STAGES = {
+    'load': ('data_loader_excel_to_mysql', os.path.join(SCRIPTS_DIR, 'data_loader_excel_to_mysql.py')),
+    'roll_rates': ('Arrears_Roll_Rates', os.path.join(SCRIPTS_DIR, 'Arrears_Roll_Rates.py')),
+    'timeseries': ('Repayment_TimeSeries_Store', os.path.join(SCRIPTS_DIR, 'Repayment_TimeSeries_Store.py')),
+    'vintage': ('Vintage_Cohort_Engine', os.path.join(SCRIPTS_DIR, 'Vintage_Cohort_Engine.py')),
+    'historical_viz': ('Viz_Historical_Analysis', os.path.join(VIZ_DIR, 'Viz_Historical_Analysis.py')),
+    'model_selection': ('Model_Selection_CV', os.path.join(SCRIPTS_DIR, 'Model_Selection_CV.py')),
+    'scoring': ('Model_Training_V2_Scoring', os.path.join(SCRIPTS_DIR, 'Model_Training_V2_Scoring.py')),
+    'cutoff': ('Cutoff_Optimization', os.path.join(SCRIPTS_DIR, 'Cutoff_Optimization.py')),
+    'clustering': ('Credit_Limit_Clustering', os.path.join(SCRIPTS_DIR, 'Credit_Limit_Clustering.py')),
+    'sketch': ('Score_Quantile_Sketch', os.path.join(SCRIPTS_DIR, 'Score_Quantile_Sketch.py')),
+    'etl': ('ETL_Portfolio_Setup', os.path.join(SCRIPTS_DIR, 'ETL_Portfolio_Setup.py')),
+    'dashboard': ('Viz_Dashboard_KPIs', os.path.join(VIZ_DIR, 'Viz_Dashboard_KPIs.py')),
+}
+# Stage groups: the full pipeline, and the intraday refresh (re-score and re-report, no re-ingestion)
+STAGE_GROUPS = {
+    'all': list(STAGES),
+    'refresh': ['scoring', 'cutoff', 'clustering', 'sketch', 'etl', 'dashboard'],
+}
+# Offline stages (no MySQL needed) timed by --benchmark unless stages are given
+BENCHMARK_STAGES = ['scoring', 'cutoff', 'clustering', 'sketch']
+
+
+# --- 1. Worker State (engine, cached reference data, fitted models) ---
+_state = {}
+
+
+def _file_key(*paths):
+    """Change key for input files: (mtime, size) of each file, None if missing."""
+    return tuple((os.stat(p).st_mtime_ns, os.stat(p).st_size) if os.path.exists(p) else None for p in paths)
+
+
+def _reuse(name, key):
+    """The cached value for `name` while its key is unchanged, else None."""
+    entry = _state.get(name)
+    return entry[1] if entry is not None and entry[0] == key else None
+
+
+def _keep(name, key, value):
+    _state[name] = (key, value)
+    return value
+
+
+def _engine():
+    """One pooled engine for the worker's lifetime."""
+    if 'engine' not in _state:
+        from db_connection import create_db_engine
+        # pre_ping replaces pooled connections that MySQL closed while the worker was idle
+        _state['engine'] = create_db_engine(pool_pre_ping=True, pool_recycle=POOL_RECYCLE_SECONDS)
+    return _state['engine']
+
+
+def _training_data():
+    """The raw training table, re-read only when ML_Credit_Risk_Data.csv changes."""
+    import Model_Training_V2_Scoring as scoring
+    key = _file_key(scoring.TRAINING_DATA_FILE)
+    cached = _reuse('training_data', key)
+    return cached if cached is not None else _keep('training_data', key, scoring.load_training_data())
+
+
+def _run_scoring():
+    import Model_Training_V2_Scoring as scoring
+    df_raw = _training_data()
+    # Refit only when the training table or the selected configuration changes
+    key = _file_key(scoring.TRAINING_DATA_FILE, scoring.MODEL_CONFIG_FILE)
+    cached = _reuse('scoring_model', key)
+    if cached is None:
+        config = scoring.load_model_config()
+        df_merged = scoring.prepare_training_data(config, df_raw)
+        fitted = scoring.main(config, df_merged)
+        _keep('scoring_model', key, (config, df_merged, fitted))
+    else:
+        scoring.main(*cached)
+
+
+def _run_clustering():
+    import pandas as pd
+    import Credit_Limit_Clustering as clustering
+    df_base = clustering.load_customer_base()
+    # Segments depend only on the customer base. Features are drawn from a fixed seed by row
+    # position, so the key covers the ids in order (a reordered base gets different features)
+    key = hashlib.sha256(pd.util.hash_pandas_object(df_base['customer_id'], index=False).to_numpy().tobytes()).hexdigest()
+    _keep('segments', key, clustering.main(df_base, _reuse('segments', key)))
+
+
+def _run_stage(name, request):
+    """Calls the stage's main() with the worker's warm state."""
+    if name == 'scoring':
+        return _run_scoring()
+    if name == 'clustering':
+        return _run_clustering()
+
+    module = importlib.import_module(STAGES[name][0])
+    if name == 'model_selection':
+        return module.main(_training_data())
+    if name == 'etl':
+        return module.main(_engine(), module.current_snapshot_date(request.get('snapshot_date')))
+    if name == 'sketch':
+        from ETL_Portfolio_Setup import current_snapshot_date
+        return module.main(str(current_snapshot_date(request.get('snapshot_date'))))
+    if name == 'cutoff':
+        return module.main()
+    return module.main(_engine())
+
+
+def _execute(name, request):
+    """Runs one stage, capturing its output; a stage's exit() ends the stage (status 'exit'), not the worker."""
+    output = io.StringIO()
+    start = time.perf_counter()
+    status = 'ok'
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            _run_stage(name, request)
+        except SystemExit:
+            status = 'exit'
+        except Exception:
+            status = 'error'
+            traceback.print_exc()
+    return {'stage': name, 'status': status, 'seconds': time.perf_counter() - start, 'output': output.getvalue()}
+
+
+# --- 2. Server ---
+
+def serve():
+    if not WORKER_AUTHKEY:
+        raise RuntimeError("PIPELINE_WORKER_KEY is not set; refusing to accept pickled requests without a private key.")
+    # Stage scripts use paths relative to the project root and save figures without a display
+    os.chdir(PROJECT_ROOT)
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    sys.path[:0] = [SCRIPTS_DIR, VIZ_DIR]
+
+    start = time.perf_counter()
+    # Pre-load the libraries every stage uses
+    import pandas
+    import sqlalchemy
+    print(f"Pipeline worker listening on {WORKER_ADDRESS[0]}:{WORKER_ADDRESS[1]} "
+          f"(libraries loaded in {time.perf_counter() - start:.2f}s).")
+
+    served = 0
+    started_at = time.time()
+    with Listener(WORKER_ADDRESS, authkey=WORKER_AUTHKEY) as listener:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"WARNING: Rejected connection: {e}")
+                continue
+            with conn:
+                try:
+                    request = conn.recv()
+                    command = request.get('command')
+                    if command == 'run':
+                        for name in request['stages']:
+                            result = _execute(name, request)
+                            print(f"  {name}: {result['status']} in {result['seconds']:.2f}s")
+                            conn.send(result)
+                            # Later stages read this stage's outputs, so a stage that exits or fails ends the request
+                            if result['status'] != 'ok':
+                                break
+                        conn.send({'done': True})
+                        served += 1
+                    elif command == 'status':
+                        conn.send({
+                            'uptime_seconds': time.time() - started_at,
+                            'requests_served': served,
+                            'cached': sorted(_state),
+                            'stage_modules_loaded': sorted(name for name, (module, _) in STAGES.items() if module in sys.modules),
+                        })
+                    elif command == 'shutdown':
+                        print("Pipeline worker stopped.")
+                        with contextlib.suppress(EOFError, OSError):
+                            conn.send({'done': True})
+                        break
+                except (EOFError, OSError) as e:
+                    # The client went away (e.g. Ctrl-C in run_pipeline.ps1 -Warm); keep serving the next one
+                    print(f"WARNING: Client disconnected: {e!r}")
+
+
+# --- 3. Client ---
+
+def _connect():
+    return Client(WORKER_ADDRESS, authkey=WORKER_AUTHKEY)
+
+
+def worker_running():
+    try:
+        with _connect() as conn:
+            conn.send({'command': 'status'})
+            conn.recv()
+        return True
+    except (ConnectionRefusedError, OSError, EOFError):
+        return False
+
+
+def start_worker():
+    """Starts a detached worker unless one is already listening; waits until it accepts requests."""
+    if worker_running():
+        return None
+    flags = {'creationflags': subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP} \
+        if os.name == 'nt' else {'start_new_session': True}
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve'], cwd=PROJECT_ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **flags)
+    deadline = time.time() + START_TIMEOUT_SECONDS
+    while time.time() < deadline:
+        if worker_running():
+            return process
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"Pipeline worker did not start within {START_TIMEOUT_SECONDS}s.")
+
+
+def stop_worker():
+    with _connect() as conn:
+        conn.send({'command': 'shutdown'})
+        conn.recv()
+
+
+def run_remote(stages, echo=True):
+    """Sends a stage request to the worker; returns one result per stage."""
+    results = []
+    with _connect() as conn:
+        conn.send({'command': 'run', 'stages': stages, 'snapshot_date': os.getenv('SNAPSHOT_DATE')})
+        while True:
+            result = conn.recv()
+            if result.get('done'):
+                return results
+            results.append(result)
+            if echo:
+                print(result['output'], end='')
+                print(f"[{result['stage']}: {result['status']} in {result['seconds']:.2f}s (warm)]")
+
+
+def expand_stages(names):
+    stages = []
+    for name in names:
+        if name in STAGE_GROUPS:
+            stages += STAGE_GROUPS[name]
+        elif name in STAGES:
+            stages.append(name)
+        else:
+            raise ValueError(f"Unknown stage '{name}'. Stages: {', '.join(STAGES)}; groups: {', '.join(STAGE_GROUPS)}.")
+    return stages
+
+
+def benchmark(stages):
+    """
+    Cold: each stage as its own `python script.py` process (as run_pipeline.ps1 does).
+    Warm: the same stage sent to the worker, after one warm-up request that loads
+    libraries, reference data and fitted models.
+    """
+    rows = []
+    process = start_worker()
+    try:
+        for name in stages:
+            start = time.perf_counter()
+            subprocess.run([sys.executable, STAGES[name][1]], cwd=PROJECT_ROOT, capture_output=True,
+                           env={**os.environ, 'MPLBACKEND': 'Agg'})
+            cold = time.perf_counter() - start
+
+            first = run_remote([name], echo=False)[0]
+            start = time.perf_counter()
+            warm = run_remote([name], echo=False)[0]
+            warm_round_trip = time.perf_counter() - start
+
+            rows.append({
+                'stage': name,
+                'cold_process_s': round(cold, 3),
+                'warm_first_request_s': round(first['seconds'], 3),
+                'warm_request_s': round(warm_round_trip, 3),
+                'speedup': round(cold / warm_round_trip, 1),
+                'status': warm['status'],
+            })
+            print(f"  {name}: cold {cold:.2f}s | warm {warm_round_trip:.3f}s ({warm['status']})")
+    finally:
+        if process is not None:
+            stop_worker()
+    return rows
+
+
+if __name__ == "__main__":
+    # Usage: python 02_Scripts_Python/Pipeline_Worker.py --serve | --start | --stop | --status
+    #        python 02_Scripts_Python/Pipeline_Worker.py STAGE_OR_GROUP [...]
+    #        python 02_Scripts_Python/Pipeline_Worker.py --benchmark [STAGE ...]
+    args = sys.argv[1:]
+    if not args:
+        print(f"Stages: {', '.join(STAGES)}\nGroups: {', '.join(STAGE_GROUPS)}")
+        exit()
+
+    if not WORKER_AUTHKEY:
+        print("ERROR: PIPELINE_WORKER_KEY is not set. Add a private, random value to .env "
+              "(e.g. python -c \"import secrets; print(secrets.token_hex(32))\").")
+        sys.exit(1)
+
+    if args[0] == '--serve':
+        serve()
+
+    elif args[0] == '--start':
+        start_worker()
+        print(f"Pipeline worker ready on {WORKER_ADDRESS[0]}:{WORKER_ADDRESS[1]}.")
+
+    elif args[0] == '--stop':
+        stop_worker()
+        print("Pipeline worker stopped.")
+
+    elif args[0] == '--status':
+        try:
+            with _connect() as conn:
+                conn.send({'command': 'status'})
+                print(conn.recv())
+        except (ConnectionRefusedError, OSError):
+            print("No pipeline worker is running.")
+
+    elif args[0] == '--benchmark':
+        try:
+            stages = expand_stages(args[1:] or BENCHMARK_STAGES)
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            exit()
+        print(f"--- Cold-Start vs Warm-Worker Benchmark ({len(stages)} stages) ---")
+        rows = benchmark(stages)
+        cold_total = sum(row['cold_process_s'] for row in rows)
+        warm_total = sum(row['warm_request_s'] for row in rows)
+        with open(BENCHMARK_FILE, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Total: cold {cold_total:.2f}s | warm {warm_total:.2f}s ({cold_total / warm_total:.1f}x faster)")
+        print(f"Benchmark saved to: {BENCHMARK_FILE}")
+
+    else:
+        try:
+            stages = expand_stages(args)
+            results = run_remote(stages)
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        except (ConnectionRefusedError, OSError):
+            print(f"ERROR: No pipeline worker on {WORKER_ADDRESS[0]}:{WORKER_ADDRESS[1]}. "
+                  f"Start one with: python 02_Scripts_Python/Pipeline_Worker.py --start")
+            sys.exit(1)
+        if any(result['status'] != 'ok' for result in results):
+            print(f"ERROR: Stage '{results[-1]['stage']}' did not complete ({results[-1]['status']}); later stages were not run.")
+            sys.exit(1)
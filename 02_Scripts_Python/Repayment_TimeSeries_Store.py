@@ -0,0 +1,248 @@
+import pandas as pd
+import numpy as np
+import os
+import sys
+import json
+import shutil
+from sqlalchemy.sql import text
+
+from db_connection import connect_or_exit
+
+# --- Configuration & Setup ---
+DATA_PATH = '04_Analysis_Outputs/'
+STORE_DIR = os.path.join(DATA_PATH, "timeseries_store")
+MANIFEST_FILE = os.path.join(STORE_DIR, "manifest.json")
+INDEX_FILE = os.path.join(STORE_DIR, "customer_index.json")
+EXPORT_FILE = os.path.join(DATA_PATH, "Daily_Repayment_All_Customers.csv")
+SOURCE_TABLE = 'loansnapshot'
+
+# Value columns stored as one memory-mapped array each, customer-sorted
+VALUE_COLUMNS = ['cumulative_paid', 'outstanding_balance']
+MAX_SEGMENTS = 30   # Appended daily segments are compacted into one once this many exist
+
+# Store layout:
+#   timeseries_store/manifest.json          -> ordered segment names and last stored date
+#   timeseries_store/customer_index.json    -> customer_id -> [[segment, start row, stop row], ...]
+#   timeseries_store/seg_XXXX/customer_ids  -> sorted unique customer ids of the segment
+#   timeseries_store/seg_XXXX/offsets       -> rows of customer i are offsets[i]:offsets[i + 1]
+#   timeseries_store/seg_XXXX/<column>      -> dates, cumulative_paid, outstanding_balance, daily_repayment
+# The first segment holds the full history; each daily update appends a small segment.
+
+
+# --- 1. Building Segments ---
+
+def build_segment(df, previous_paid=None):
+    """
+    Sorts one batch of rows by (customer_id, date) and returns its arrays.
+    daily_repayment is a diff of cumulative_paid that resets at every customer
+    boundary: a customer's first row is diffed against previous_paid (their last
+    stored value), or against 0 like LAG(cumulative_paid, 1, 0) in query 6.
+    """
+    customer_ids = df['customer_id'].to_numpy().astype(str)
+    dates = pd.to_datetime(df['date']).to_numpy().astype('datetime64[D]')
+    order = np.lexsort((dates, customer_ids))
+
+    customer_ids = customer_ids[order]
+    unique_ids, starts = np.unique(customer_ids, return_index=True)
+    offsets = np.append(starts, len(customer_ids)).astype(np.int64)
+
+    segment = {'customer_ids': unique_ids, 'offsets': offsets, 'dates': dates[order]}
+    for col in VALUE_COLUMNS:
+        segment[col] = df[col].to_numpy(dtype=np.float64)[order]
+
+    paid = segment['cumulative_paid']
+    daily = np.diff(paid, prepend=0.0)
+    first_rows = offsets[:-1]
+    baseline = np.zeros(len(unique_ids))
+    if previous_paid is not None:
+        baseline = previous_paid.reindex(unique_ids, fill_value=0.0).to_numpy()
+    daily[first_rows] = paid[first_rows] - baseline
+    segment['daily_repayment'] = daily
+    return segment
+
+
+def write_segment(name, segment):
+    seg_dir = os.path.join(STORE_DIR, name)
+    os.makedirs(seg_dir, exist_ok=True)
+    for key, values in segment.items():
+        np.save(os.path.join(seg_dir, f"{key}.npy"), values, allow_pickle=False)
+
+
+def next_segment_name(segments):
+    return f"seg_{int(segments[-1][4:]) + 1:04d}" if segments else "seg_0000"
+
+
+def write_manifest(segments, last_date):
+    with open(MANIFEST_FILE, 'w') as f:
+        json.dump({'segments': segments, 'last_date': str(last_date)}, f, indent=2)
+
+
+def index_segment(index, name, customer_ids, offsets):
+    """Adds one segment's row ranges to the customer index (in place)."""
+    offsets = np.asarray(offsets).tolist()
+    for i, customer_id in enumerate(np.asarray(customer_ids).tolist()):
+        index.setdefault(customer_id, []).append([name, offsets[i], offsets[i + 1]])
+    return index
+
+
+def write_index(segments, index):
+    """Saves the customer index with the segment list it covers, so a stale index is detected on open."""
+    with open(INDEX_FILE, 'w') as f:
+        json.dump({'segments': segments, 'customers': index}, f)
+
+
+# --- 2. Reading the Store ---
+
+def open_store():
+    """
+    Loads the manifest and the customer index. Segment arrays are memory-mapped on
+    first use (see segment_array), so opening the store maps no segment files.
+    Returns None if the store has not been built yet.
+    """
+    if not os.path.exists(MANIFEST_FILE):
+        return None
+    with open(MANIFEST_FILE) as f:
+        manifest = json.load(f)
+    store = {'manifest': manifest, 'arrays': {}}
+
+    index = None
+    if os.path.exists(INDEX_FILE):
+        with open(INDEX_FILE) as f:
+            saved = json.load(f)
+        if saved['segments'] == manifest['segments']:
+            index = saved['customers']
+    if index is None:
+        # Missing, or interrupted between writing the index and the manifest: rebuild from the offsets
+        index = {}
+        for name in manifest['segments']:
+            index_segment(index, name, segment_array(store, name, 'customer_ids'), segment_array(store, name, 'offsets'))
+        write_index(manifest['segments'], index)
+    store['index'] = index
+    return store
+
+
+def segment_array(store, name, key):
+    """One array of one segment, memory-mapped the first time it is read."""
+    if (name, key) not in store['arrays']:
+        path = os.path.join(STORE_DIR, name, f"{key}.npy")
+        store['arrays'][(name, key)] = np.load(path, mmap_mode='r')
+    return store['arrays'][(name, key)]
+
+
+def customer_history(store, customer_id):
+    """One index lookup, then one slice per segment holding the customer (query 6 for any customer)."""
+    parts = []
+    for name, start, stop in store['index'].get(customer_id, []):
+        parts.append({key: segment_array(store, name, key)[start:stop] for key in ['dates', 'daily_repayment'] + VALUE_COLUMNS})
+    if not parts:
+        return pd.DataFrame(columns=['date', 'cumulative_paid', 'daily_repayment_amount', 'outstanding_balance'])
+    return pd.DataFrame({
+        'date': np.concatenate([p['dates'] for p in parts]),
+        'cumulative_paid': np.concatenate([p['cumulative_paid'] for p in parts]),
+        'daily_repayment_amount': np.concatenate([p['daily_repayment'] for p in parts]),
+        'outstanding_balance': np.concatenate([p['outstanding_balance'] for p in parts]),
+    })
+
+
+def export_all(store):
+    """Bulk export for every customer, sorted by (customer_id, date)."""
+    frames = []
+    for name in store['manifest']['segments']:
+        counts = np.diff(segment_array(store, name, 'offsets'))
+        frames.append(pd.DataFrame({
+            'customer_id': np.repeat(np.asarray(segment_array(store, name, 'customer_ids')), counts),
+            'date': np.asarray(segment_array(store, name, 'dates')),
+            'cumulative_paid': np.asarray(segment_array(store, name, 'cumulative_paid')),
+            'daily_repayment_amount': np.asarray(segment_array(store, name, 'daily_repayment')),
+            'outstanding_balance': np.asarray(segment_array(store, name, 'outstanding_balance')),
+        }))
+    df_all = pd.concat(frames, ignore_index=True)
+    if len(frames) > 1:
+        df_all = df_all.sort_values(['customer_id', 'date'], kind='stable', ignore_index=True)
+    return df_all
+
+
+def last_paid_per_customer(store):
+    """Each customer's latest cumulative_paid (Series by customer_id), the baseline for the next appended day."""
+    # Last row of every customer in every segment; later segments hold later days
+    segments = store['manifest']['segments']
+    ids = np.concatenate([np.asarray(segment_array(store, name, 'customer_ids')) for name in segments])
+    paid = np.concatenate([
+        np.asarray(segment_array(store, name, 'cumulative_paid'))[np.asarray(segment_array(store, name, 'offsets')[1:]) - 1]
+        for name in segments
+    ])
+    return pd.Series(paid, index=ids).groupby(level=0, sort=False).last()
+
+
+# --- 3. Build / Update ---
+
+def update_store(engine):
+    """Builds the store on first run; afterwards appends only days after the last stored date."""
+    store = open_store()
+    last_date = store['manifest']['last_date'] if store else None
+    query = f"SELECT customer_id, `date`, {', '.join(VALUE_COLUMNS)} FROM {SOURCE_TABLE}"
+    if last_date:
+        query += " WHERE `date` > :last_date"
+    params = {'last_date': pd.Timestamp(last_date).to_pydatetime()} if last_date else {}
+    df_new = pd.read_sql(text(query), engine, params=params)
+
+    if df_new.empty:
+        print(f"Store is up to date (last date: {last_date}).")
+        return store
+
+    previous_paid = last_paid_per_customer(store) if store else None
+    segment = build_segment(df_new, previous_paid)
+    segments = store['manifest']['segments'] if store else []
+    name = next_segment_name(segments)
+    write_segment(name, segment)
+    index = index_segment(store['index'] if store else {}, name, segment['customer_ids'], segment['offsets'])
+    write_index(segments + [name], index)
+    new_last_date = segment['dates'].max()
+    write_manifest(segments + [name], new_last_date)
+    print(f"Appended {len(df_new)} rows ({segment['customer_ids'].size} customers) as {name}.")
+
+    store = open_store()
+    if len(store['manifest']['segments']) > MAX_SEGMENTS:
+        store = compact_store(store)
+    return store
+
+
+def compact_store(store):
+    """Rewrites all segments as one customer-sorted segment."""
+    df_all = export_all(store)
+    # The full history starts at each customer's first day, so the recomputed deltas are unchanged
+    segment = build_segment(df_all)
+    old_segments = store['manifest']['segments']
+    name = next_segment_name(old_segments)
+    write_segment(name, segment)
+    write_index([name], index_segment({}, name, segment['customer_ids'], segment['offsets']))
+    write_manifest([name], store['manifest']['last_date'])
+    for old in old_segments:
+        shutil.rmtree(os.path.join(STORE_DIR, old), ignore_errors=True)
+    print(f"Compacted {len(old_segments)} segments into {name}.")
+    return open_store()
+
+
+# --- 4. Execution ---
+
+def main(engine=None, customer_ids=(), export=False):
+    """Brings the store up to date, then prints the requested customers and optionally exports everyone."""
+    if engine is None:
+        engine = connect_or_exit("time-series store update")
+
+    os.makedirs(STORE_DIR, exist_ok=True)
+    store = update_store(engine)
+
+    for customer_id in customer_ids:
+        print(f"\nDaily repayment for {customer_id}:")
+        print(customer_history(store, customer_id))
+
+    if export:
+        df_all = export_all(store)
+        df_all.to_csv(EXPORT_FILE, index=False)
+        print(f"\nDaily repayment for {df_all['customer_id'].nunique()} customers saved to: {EXPORT_FILE}")
+
+
+if __name__ == "__main__":
+    # Usage: python 02_Scripts_Python/Repayment_TimeSeries_Store.py [CUSTOMER_ID ...] [--export]
+    main(customer_ids=[arg for arg in sys.argv[1:] if not arg.startswith('--')], export='--export' in sys.argv)
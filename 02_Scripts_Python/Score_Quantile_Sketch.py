@@ -0,0 +1,254 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import glob
+import hashlib
+import time
+
+# --- Configuration ---
+DATA_PATH = '04_Analysis_Outputs/'
+SCORE_FILE = os.path.join(DATA_PATH, "Model_Scoring_Output.csv")
+LIMIT_FILE = os.path.join(DATA_PATH, "Credit_Limit_Recommendations.csv")
+SKETCH_DIR = os.path.join(DATA_PATH, "score_sketches")          # One JSON file per scoring batch
+MERGED_SKETCH_FILE = os.path.join(DATA_PATH, "Score_Sketch_Merged.json")
+PERCENTILE_FILE = os.path.join(DATA_PATH, "Score_Percentiles_By_Segment.csv")
+CUTOFF_FILE = os.path.join(DATA_PATH, "Optimal_Cutoff.csv")     # Written by Cutoff_Optimization.py
+
+# Batch id of this run (same convention as the monitoring snapshot date)
+BATCH_ID = pd.Timestamp(os.getenv('SNAPSHOT_DATE') or pd.Timestamp.today()).strftime('%Y-%m-%d')
+ALL_SEGMENTS = 'ALL'
+PERCENTILES = [0.01, 0.05, 0.10, 0.25, 0.50, 0.75, 0.90, 0.95, 0.99]
+
+# KLL accuracy parameter. Error bound (normalized rank error, 99% confidence), as
+# published for KLL sketches: about 1.33% for rank/CDF queries and 1.65% for PMF
+# queries at k=200, shrinking roughly as 1/k. Memory is O(k) items regardless of
+# n (at most about 3*k items retained). Merging two sketches keeps the same bound.
+SKETCH_K = 200
+
+
+def sketch_seed(*parts):
+    """Stable 64-bit seed from a batch or shard id (and segment), so sketches compact independently."""
+    return int(hashlib.sha256('/'.join(map(str, parts)).encode()).hexdigest()[:16], 16)
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang & Liberty, 2016).
+
+    Items live in levels of "compactors"; an item at level h stands for 2**h input
+    values. When a level exceeds its capacity it is sorted and every other item
+    (random offset) is promoted to the next level, halving its size. Capacities
+    shrink geometrically (factor 2/3) towards the lower levels, so total memory
+    stays O(k). Two sketches merge by concatenating level by level and compacting.
+    """
+
+    def __init__(self, k=SKETCH_K, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+        self._cdf = None
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        while True:
+            over = [h for h, items in enumerate(self.levels) if len(items) > self._capacity(h)]
+            if not over:
+                break
+            level = over[0]
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            # An odd item out stays at this level so no weight is lost
+            keep = items[-1:] if len(items) % 2 else items[:0]
+            paired = items[:len(items) - len(keep)]
+            promoted = paired[self._rng.integers(2)::2]
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+        self._cdf = None
+
+    def update(self, values):
+        """Adds a batch of values (vectorized)."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Merges another sketch into this one."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _weighted_cdf(self):
+        """Sorted retained items and their cumulative weights (cached until the next update)."""
+        if self._cdf is None:
+            items = np.concatenate(self.levels)
+            weights = np.concatenate([np.full(len(lvl), 2.0 ** h) for h, lvl in enumerate(self.levels)])
+            order = np.argsort(items, kind='stable')
+            self._cdf = (items[order], np.cumsum(weights[order]))
+        return self._cdf
+
+    def fraction_below(self, x):
+        """Estimated share of values strictly below x."""
+        items, cum_weights = self._weighted_cdf()
+        idx = np.searchsorted(items, x, side='left')
+        return float(cum_weights[idx - 1] / cum_weights[-1]) if idx > 0 else 0.0
+
+    def quantile(self, q):
+        """Estimated value at quantile q (0..1)."""
+        items, cum_weights = self._weighted_cdf()
+        idx = np.searchsorted(cum_weights, q * cum_weights[-1], side='left')
+        return float(items[min(idx, len(items) - 1)])
+
+    def to_dict(self):
+        # The RNG state travels with the sketch, so a reloaded sketch continues its own coin flips
+        return {'k': self.k, 'n': self.n, 'levels': [lvl.tolist() for lvl in self.levels],
+                'rng_state': self._rng.bit_generator.state}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(k=data['k'])
+        sketch.n = data['n']
+        sketch.levels = [np.asarray(lvl, dtype=np.float64) for lvl in data['levels']]
+        if 'rng_state' in data:
+            sketch._rng.bit_generator.state = data['rng_state']
+        return sketch
+
+
+# --- Segment Sketch Sets: {risk_segment or 'ALL': KLLSketch} ---
+
+def build_sketches(df_scores, source_id):
+    """
+    Builds one sketch over credit_score for the whole batch and one per risk_segment,
+    each seeded from `source_id` (the batch or shard id) and its segment.
+    """
+    sketches = {ALL_SEGMENTS: KLLSketch(seed=sketch_seed(source_id, ALL_SEGMENTS)).update(df_scores['credit_score'])}
+    for segment, scores in df_scores.groupby('risk_segment')['credit_score']:
+        sketches[segment] = KLLSketch(seed=sketch_seed(source_id, segment)).update(scores)
+    return sketches
+
+
+def merge_sketches(sketch_sets):
+    """Merges sketch sets (batches or shards) segment by segment."""
+    merged = {}
+    for sketches in sketch_sets:
+        for segment, sketch in sketches.items():
+            if segment in merged:
+                merged[segment].merge(sketch)
+            else:
+                merged[segment] = KLLSketch.from_dict(sketch.to_dict())
+    return merged
+
+
+def save_sketches(sketches, path):
+    with open(path, 'w') as f:
+        json.dump({segment: sketch.to_dict() for segment, sketch in sketches.items()}, f)
+
+
+def load_sketches(path):
+    with open(path) as f:
+        return {segment: KLLSketch.from_dict(data) for segment, data in json.load(f).items()}
+
+
+def load_merged():
+    """The merged sketch set and the batch ids it covers, or (None, []) before the first batch."""
+    if not os.path.exists(MERGED_SKETCH_FILE):
+        return None, []
+    with open(MERGED_SKETCH_FILE) as f:
+        data = json.load(f)
+    if 'batches' not in data:
+        # Written before the covered batches were recorded; rebuilt from the batch files
+        return None, []
+    return {segment: KLLSketch.from_dict(d) for segment, d in data['sketches'].items()}, data['batches']
+
+
+def save_batch(sketches, batch_id=BATCH_ID):
+    """
+    Persists a batch and merges it into the stored merged sketch. Only a re-run of a
+    stored batch (or a merged sketch that does not match the batch files) re-merges
+    every batch file.
+    """
+    batch_id = str(batch_id)   # The sharded run passes the snapshot date itself
+    os.makedirs(SKETCH_DIR, exist_ok=True)
+    batch_file = os.path.join(SKETCH_DIR, f"batch_{batch_id}.json")
+    stored = sorted(os.path.basename(path)[6:-5] for path in glob.glob(os.path.join(SKETCH_DIR, "batch_*.json")))
+    merged, covered = load_merged()
+    save_sketches(sketches, batch_file)
+
+    if merged is not None and batch_id not in stored and sorted(covered) == stored:
+        merged = merge_sketches([merged, sketches])
+    else:
+        merged = merge_sketches(load_sketches(path) for path in sorted(glob.glob(os.path.join(SKETCH_DIR, "batch_*.json"))))
+    batches = sorted(set(stored) | {batch_id})
+    with open(MERGED_SKETCH_FILE, 'w') as f:
+        json.dump({'batches': batches,
+                   'sketches': {segment: sketch.to_dict() for segment, sketch in merged.items()}}, f)
+    return merged, len(batches)
+
+
+def approval_rate_at(sketches, score, segment=ALL_SEGMENTS):
+    """Share of applicants approved at cut-off `score` (credit_score >= score)."""
+    return 1.0 - sketches[segment].fraction_below(score)
+
+
+def score_at_approval_rate(sketches, approval_rate, segment=ALL_SEGMENTS):
+    """Cut-off score that approves roughly `approval_rate` of applicants."""
+    return sketches[segment].quantile(1.0 - approval_rate)
+
+
+def percentile_table(sketches):
+    """Score percentiles per segment, for the dashboard."""
+    return pd.DataFrame([
+        {'risk_segment': segment, 'scored_customers': sketch.n,
+         **{f'p{int(q * 100):02d}': sketch.quantile(q) for q in PERCENTILES}}
+        for segment, sketch in sketches.items()
+    ])
+
+
+def main(batch_id=BATCH_ID):
+    """Sketches this batch's scores, folds them into the merged sketch and prints the percentiles."""
+    try:
+        df_scores = pd.read_csv(SCORE_FILE).merge(pd.read_csv(LIMIT_FILE), on='customer_id', how='inner')
+    except FileNotFoundError as e:
+        print(f"Error: Required file not found: {e.filename}.")
+        exit()
+
+    # 1. Sketch this scoring batch and merge it with every stored batch
+    merged, n_batches = save_batch(build_sketches(df_scores, batch_id), batch_id)
+    print(f"Batch {batch_id}: sketched {len(df_scores)} scores; merged sketch now covers {n_batches} batch(es).")
+
+    # 2. Percentiles per segment
+    df_percentiles = percentile_table(merged)
+    df_percentiles.to_csv(PERCENTILE_FILE, index=False)
+    print(f"Score percentiles saved to: {PERCENTILE_FILE}")
+    print(df_percentiles)
+
+    # 3. Example lookups (timed)
+    median_score = score_at_approval_rate(merged, 0.5)
+    start = time.perf_counter()
+    rate = approval_rate_at(merged, median_score)
+    lookup_us = (time.perf_counter() - start) * 1e6
+    print(f"\nScore at 50% approval: {median_score:.0f} | Approval rate at {median_score:.0f}: {rate:.1%} "
+          f"(lookup {lookup_us:.1f} µs)")
+
+    # 4. Approval rate at the optimal cut-off across all batches, this one included
+    if os.path.exists(CUTOFF_FILE):
+        optimal_score = int(pd.read_csv(CUTOFF_FILE)['Cut_off_Score'].iat[0])
+        print(f"\nApproval rate at cut-off {optimal_score} across all {merged[ALL_SEGMENTS].n} sketched scores:")
+        for segment in merged:
+            print(f"  {segment}: {approval_rate_at(merged, optimal_score, segment):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import pandas as pd
+import numpy as np
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+from Model_Training_V2_Scoring import (
+    load_model_config, prepare_training_data, fit_scoring_model, score_customers,
+    OUTPUT_FEATURES, OUTPUT_SCORE_FILE
+)
+from Credit_Limit_Clustering import synthesize_features, fit_segments, assign_limits, FINAL_OUTPUT_FILE
+from ETL_Portfolio_Setup import (
+    build_monitor_rows, prepare_snapshot, clear_staged_snapshot, stage_snapshot_rows,
+    publish_staged_snapshot, DB_TABLE, STAGING_TABLE, SNAPSHOT_DATE
+)
+from db_connection import create_db_engine
+from Score_Quantile_Sketch import build_sketches, merge_sketches, save_batch, MERGED_SKETCH_FILE
+
+# Suppress warnings for cleaner output
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+# --- Configuration ---
+# Sharded mode for the per-customer stages: score -> limit -> monitor row.
+# Models are fitted once on the full population; each shard then runs the
+# transformation in its own process and bulk-loads its rows into the staging table; the
+# day is published to the monitor table in one transaction only after every shard succeeded.
+N_SHARDS = int(os.getenv('PIPELINE_SHARDS') or os.cpu_count() or 1)
+SHARD_HASH_KEY = 'portfolio_shard0'   # 16-character key for hash_pandas_object
+LIMIT_COLUMNS = ['customer_id', 'risk_segment', 'recommended_limit']
+BENCHMARK_FILE = '04_Analysis_Outputs/Sharded_Run_Benchmark.csv'
+
+# Usage: python 02_Scripts_Python/Sharded_Portfolio_Run.py [--no-load] [--verify]
+#        python 02_Scripts_Python/Sharded_Portfolio_Run.py --benchmark [SHARDS ...] [--no-load]
+LOAD_TO_DB = '--no-load' not in sys.argv
+VERIFY = '--verify' in sys.argv
+BENCHMARK = '--benchmark' in sys.argv
+# Shard counts to time: the ones given, else 1, 2, 4, ... up to N_SHARDS
+BENCHMARK_SHARDS = [int(arg) for arg in sys.argv[1:] if arg.isdigit()] or sorted(
+    {2 ** i for i in range(N_SHARDS.bit_length()) if 2 ** i <= N_SHARDS} | {N_SHARDS}
+)
+
+
+def shard_ids(customer_ids, n_shards):
+    """Stable shard number per customer_id (same on every run, machine and Python process)."""
+    hashes = pd.util.hash_pandas_object(pd.Series(customer_ids), index=False, hash_key=SHARD_HASH_KEY)
+    return (hashes.to_numpy() % np.uint64(n_shards)).astype(int)
+
+
+def fit_population(df_merged, config):
+    """Population-level fits shared by every shard (scoring model, offset, K-Means segments)."""
+    model, offset = fit_scoring_model(df_merged, config)
+    df_cluster = synthesize_features(df_merged[['customer_id']])
+    scaler, kmeans, cluster_profile = fit_segments(df_cluster)
+    return df_cluster, (model, offset, scaler, kmeans, cluster_profile)
+
+
+def transform_customers(df_merged, df_cluster, artefacts, snapshot_date=SNAPSHOT_DATE):
+    """
+    The per-customer chain on any subset of customers. Returns the scoring output,
+    the limit recommendations and the monitor rows, all indexed like the input.
+    """
+    model, offset, scaler, kmeans, cluster_profile = artefacts
+    df_scored = score_customers(df_merged, model, offset)[OUTPUT_FEATURES]
+    df_limits = assign_limits(df_cluster, scaler, kmeans, cluster_profile)[LIMIT_COLUMNS]
+    df_monitor = build_monitor_rows(
+        df_scored.rename(columns={'Is_High_Risk': 'actual_default'}), df_limits, snapshot_date
+    )
+    # The inner merge is one-to-one in input order, so the original row positions carry over
+    df_monitor.index = df_scored.index
+    return df_scored, df_limits, df_monitor
+
+
+# --- Worker Process State ---
+_worker = {}
+
+
+def _init_worker(artefacts, load_to_db):
+    """Runs once per worker: keeps the fitted models and a DB engine for all of its shards."""
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    _worker['artefacts'] = artefacts
+    _worker['engine'] = create_db_engine() if load_to_db else None
+
+
+def _run_shard(shard):
+    shard_id, df_merged, df_cluster, snapshot_date = shard
+    df_scored, df_limits, df_monitor = transform_customers(df_merged, df_cluster, _worker['artefacts'], snapshot_date)
+    if _worker['engine'] is not None:
+        stage_snapshot_rows(_worker['engine'], df_monitor)
+    print(f"  Shard {shard_id}: {len(df_monitor)} customers processed.")
+    # Score sketches travel back instead of the parent re-reading every score
+    return df_scored, df_limits, df_monitor, build_sketches(df_monitor, f"{snapshot_date}/shard_{shard_id}")
+
+
+def run_sharded(df_merged, df_cluster, artefacts, n_shards=N_SHARDS, load_to_db=LOAD_TO_DB):
+    """
+    Partitions customers by hash and runs each shard in a worker process. Returns the
+    (scored, limits, monitor) frames merged in input order and the merged score sketches.
+    """
+    shards = shard_ids(df_merged['customer_id'], n_shards)
+    tasks = [
+        (shard_id, df_merged[shards == shard_id], df_cluster[shards == shard_id], SNAPSHOT_DATE)
+        for shard_id in range(n_shards) if (shards == shard_id).any()
+    ]
+    with ProcessPoolExecutor(max_workers=n_shards, initializer=_init_worker, initargs=(artefacts, load_to_db)) as executor:
+        results = list(executor.map(_run_shard, tasks))
+    *frames, sketches = zip(*results)
+    return tuple(pd.concat(parts).sort_index() for parts in frames), merge_sketches(sketches)
+
+
+def benchmark(df_merged, df_cluster, artefacts, shard_counts, engine=None):
+    """
+    Wall time of the sharded transformation per shard count, including the worker pool
+    start-up and pickling each shard's frames to its worker. With an engine, the shards
+    also stage their rows and the serial publish (one INSERT ... SELECT) is timed on its own.
+    """
+    rows = []
+    for n_shards in shard_counts:
+        if engine is not None:
+            clear_staged_snapshot(engine, SNAPSHOT_DATE)
+        start = time.perf_counter()
+        run_sharded(df_merged, df_cluster, artefacts, n_shards=n_shards, load_to_db=engine is not None)
+        wall = time.perf_counter() - start
+
+        publish = None
+        if engine is not None:
+            start = time.perf_counter()
+            publish_staged_snapshot(engine, SNAPSHOT_DATE)
+            publish = round(time.perf_counter() - start, 3)
+
+        rows.append({
+            'shards': n_shards,
+            'customers': len(df_merged),
+            'cpu_count': os.cpu_count(),
+            'wall_s': round(wall, 3),
+            'speedup_vs_first': round(rows[0]['wall_s'] / wall, 2) if rows else 1.0,
+            'publish_s': publish,
+        })
+        print(f"  {n_shards} shard(s): {wall:.2f}s" + (f" | publish {publish:.2f}s" if publish is not None else ""))
+    return rows
+
+
+if __name__ == "__main__":
+    print(f"--- Sharded Portfolio Run ({N_SHARDS} shards) ---")
+    config = load_model_config()
+    df_merged = prepare_training_data(config)
+
+    # 1. Fit once on the full population
+    df_cluster, artefacts = fit_population(df_merged, config)
+
+    # 2. Prepare the day's monitor partition and an empty staging area before the shards load
+    if LOAD_TO_DB:
+        try:
+            engine = create_db_engine()
+            prepare_snapshot(engine, SNAPSHOT_DATE)
+            clear_staged_snapshot(engine, SNAPSHOT_DATE)
+        except Exception as e:
+            print(f"FATAL ERROR: Could not prepare {DB_TABLE}: {e}")
+            exit()
+
+    if BENCHMARK:
+        print(f"Benchmarking shard counts {BENCHMARK_SHARDS} on {len(df_merged)} customers...")
+        df_bench = pd.DataFrame(benchmark(df_merged, df_cluster, artefacts, BENCHMARK_SHARDS,
+                                          engine if LOAD_TO_DB else None))
+        df_bench.to_csv(BENCHMARK_FILE, index=False)
+        print(f"Benchmark saved to: {BENCHMARK_FILE}")
+        print(df_bench.to_string(index=False))
+        exit()
+
+    # 3. Score -> limit -> staged monitor rows, one worker process per shard
+    start = time.perf_counter()
+    try:
+        (df_scored, df_limits, df_monitor), sketches = run_sharded(df_merged, df_cluster, artefacts)
+    except Exception as e:
+        # The monitor table still holds the previous complete snapshot; drop the partial staging
+        print(f"FATAL ERROR: A shard failed, snapshot {SNAPSHOT_DATE} was not published: {e}")
+        if LOAD_TO_DB:
+            clear_staged_snapshot(engine, SNAPSHOT_DATE)
+        exit()
+    elapsed = time.perf_counter() - start
+    print(f"Processed {len(df_monitor)} customers in {elapsed:.2f}s")
+
+    # 4. Publish the complete day in one transaction
+    if LOAD_TO_DB:
+        published = publish_staged_snapshot(engine, SNAPSHOT_DATE)
+        print(f"SUCCESS: {published} records published from '{STAGING_TABLE}' to '{DB_TABLE}' for snapshot {SNAPSHOT_DATE}.")
+
+    df_scored.to_csv(OUTPUT_SCORE_FILE, index=False)
+    df_limits.to_csv(FINAL_OUTPUT_FILE, index=False)
+    print(f"Scores saved to: {OUTPUT_SCORE_FILE}")
+    print(f"Credit Limit Recommendations saved to: {FINAL_OUTPUT_FILE}")
+    _, n_batches = save_batch(sketches, SNAPSHOT_DATE)
+    print(f"Score sketches merged into: {MERGED_SKETCH_FILE} ({n_batches} batch(es))")
+
+    # 5. Optional check against the single-process transformation
+    if VERIFY:
+        single = transform_customers(df_merged, df_cluster, artefacts)
+        identical = all(sharded.equals(expected) for sharded, expected in zip((df_scored, df_limits, df_monitor), single))
+        print(f"Verification: sharded output {'matches' if identical else 'DIFFERS FROM'} the single-process run.")
@@ -0,0 +1,171 @@
+import pandas as pd
+import numpy as np
+import os
+from sqlalchemy.sql import text
+
+from db_connection import connect_or_exit
+
+# --- Configuration & Setup ---
+DATA_PATH = '04_Analysis_Outputs/'
+LOAN_STATE_FILE = os.path.join(DATA_PATH, "Vintage_Loan_State.csv")     # One row per loan (engine state)
+CELLS_FILE = os.path.join(DATA_PATH, "Vintage_Cohort_Cells.csv")        # Cohort x months-on-book aggregates
+CURVES_FILE = os.path.join(DATA_PATH, "Vintage_Curves.csv")             # Small frame read by the visualizations
+SOURCE_TABLE = 'loansnapshot'
+
+# Same default definition as the scoring target and query 7: more than 5 days in arrears
+DEFAULT_DAYS_IN_ARREARS = 5
+
+# Per-loan contribution to its (cohort, mob) cell, taken from its last observation in that month on book
+CONTRIB_COLUMNS = ['loans_observed', 'defaulted_loans', 'paid_off_loans', 'defaulter_repayment', 'defaulter_loan_amount']
+LOAN_STATE_COLUMNS = ['loan_id', 'customer_id', 'origination_date', 'cohort', 'loan_amount',
+                      'last_date', 'last_mob', 'ever_default'] + CONTRIB_COLUMNS
+CELL_KEYS = ['cohort', 'months_on_book']
+
+
+def month_index(dates):
+    """Months since year 0, so months-on-book is a plain subtraction."""
+    dates = pd.to_datetime(dates)
+    return dates.dt.year * 12 + dates.dt.month
+
+
+def load_state():
+    """Returns (loan_state, cells); empty frames on the first run."""
+    if os.path.exists(LOAN_STATE_FILE) and os.path.exists(CELLS_FILE):
+        loans = pd.read_csv(LOAN_STATE_FILE, parse_dates=['origination_date', 'last_date'])
+        cells = pd.read_csv(CELLS_FILE)
+        return loans, cells
+    loans = pd.DataFrame(columns=LOAN_STATE_COLUMNS)
+    cells = pd.DataFrame(columns=CELL_KEYS + CONTRIB_COLUMNS)
+    return loans, cells
+
+
+def apply_new_rows(df_new, loans, cells):
+    """
+    Folds a batch of new snapshot rows into the engine state.
+
+    Each loan contributes its last observation in a month on book to that (cohort, mob)
+    cell. A new day therefore only replaces the loan's contribution to its current
+    cell: the old contribution is subtracted and the new one added, so only the
+    cells touched by the batch change.
+    """
+    df_new = df_new.sort_values(['loan_id', 'date'], kind='stable').copy()
+    df_new['date'] = pd.to_datetime(df_new['date'])
+
+    # 1. Register newly originated loans (first observation = origination)
+    loans = loans.set_index('loan_id')
+    first_rows = df_new.groupby('loan_id', sort=False).first()
+    new_loans = first_rows.loc[~first_rows.index.isin(loans.index)]
+    if len(new_loans):
+        registered = pd.DataFrame({
+            'customer_id': new_loans['customer_id'],
+            'origination_date': new_loans['date'],
+            'cohort': new_loans['date'].dt.strftime('%Y-%m'),
+            'loan_amount': new_loans['loan_amount'].astype(float),
+            'last_date': pd.NaT,
+            'last_mob': -1,
+            'ever_default': False,
+        }).assign(**{col: 0.0 for col in CONTRIB_COLUMNS})
+        loans = pd.concat([loans, registered]) if len(loans) else registered
+
+    # 2. Per-row state: months on book and default-to-date (carried over from earlier batches)
+    loan_info = loans.loc[df_new['loan_id']]
+    df_new['cohort'] = loan_info['cohort'].to_numpy()
+    df_new['months_on_book'] = (
+        month_index(df_new['date']).to_numpy() - month_index(loan_info['origination_date']).to_numpy()
+    )
+    defaulted_today = df_new['days_in_arrears'].to_numpy() > DEFAULT_DAYS_IN_ARREARS
+    df_new['ever_default'] = (
+        pd.Series(defaulted_today, index=df_new.index).groupby(df_new['loan_id']).cummax().to_numpy()
+        | loan_info['ever_default'].astype(bool).to_numpy()
+    )
+
+    # 3. New contribution of each loan to each (cohort, mob) cell it was observed in
+    last_in_mob = df_new.groupby(['loan_id', 'months_on_book'], sort=False).tail(1)
+    loan_amount = loans.loc[last_in_mob['loan_id'], 'loan_amount'].to_numpy()
+    ever_default = last_in_mob['ever_default'].to_numpy()
+    new_contrib = pd.DataFrame({
+        'loan_id': last_in_mob['loan_id'].to_numpy(),
+        'cohort': last_in_mob['cohort'].to_numpy(),
+        'months_on_book': last_in_mob['months_on_book'].to_numpy(),
+        'loans_observed': 1.0,
+        'defaulted_loans': ever_default.astype(float),
+        'paid_off_loans': (last_in_mob['outstanding_balance'].to_numpy() == 0).astype(float),
+        'defaulter_repayment': np.where(ever_default, last_in_mob['cumulative_repayment'].to_numpy(), 0.0),
+        'defaulter_loan_amount': np.where(ever_default, loan_amount, 0.0),
+    })
+
+    # 4. Old contributions to retract: only the loan's previously stored (current) month on book
+    previous = loans.loc[new_contrib['loan_id']]
+    same_cell = previous['last_mob'].to_numpy() == new_contrib['months_on_book'].to_numpy()
+    old_contrib = new_contrib.loc[same_cell, ['cohort', 'months_on_book']].copy()
+    for col in CONTRIB_COLUMNS:
+        old_contrib[col] = -previous.loc[same_cell, col].to_numpy(dtype=float)
+
+    cell_delta = pd.concat([new_contrib.drop(columns='loan_id'), old_contrib]).groupby(CELL_KEYS)[CONTRIB_COLUMNS].sum()
+    cells = cells.set_index(CELL_KEYS)[CONTRIB_COLUMNS].astype(float) if len(cells) else cell_delta.iloc[:0]
+    cells = cells.add(cell_delta, fill_value=0).reset_index()
+
+    # 5. Each loan's latest cell contribution becomes its state
+    latest = new_contrib.groupby('loan_id', sort=False).tail(1).set_index('loan_id')
+    last_rows = df_new.groupby('loan_id', sort=False).tail(1).set_index('loan_id')
+    loans.loc[latest.index, CONTRIB_COLUMNS] = latest[CONTRIB_COLUMNS].to_numpy()
+    loans.loc[latest.index, 'last_mob'] = latest['months_on_book'].to_numpy()
+    loans.loc[last_rows.index, 'last_date'] = last_rows['date'].to_numpy()
+    loans.loc[last_rows.index, 'ever_default'] = last_rows['ever_default'].to_numpy()
+
+    return loans.reset_index(names='loan_id')[LOAN_STATE_COLUMNS], cells, cell_delta.index
+
+
+def vintage_curves(loans, cells):
+    """
+    Cumulative default, paid-off and recovery curves per cohort by months on book.
+    Rates are over the loans observed at that month on book, so a young cohort's
+    partially elapsed month is not diluted by loans that have not reached it yet.
+    """
+    cohort_size = loans.groupby('cohort').size().rename('cohort_loans')
+    curves = cells.merge(cohort_size, left_on='cohort', right_index=True)
+    curves['cumulative_default_rate'] = curves['defaulted_loans'] / curves['loans_observed']
+    curves['paid_off_rate'] = curves['paid_off_loans'] / curves['loans_observed']
+    curves['recovery_rate_defaulters'] = (
+        curves['defaulter_repayment'] / curves['defaulter_loan_amount'].replace(0, np.nan)
+    )
+    curves = curves.sort_values(CELL_KEYS).reset_index(drop=True)
+    return curves[CELL_KEYS + ['cohort_loans', 'loans_observed', 'cumulative_default_rate',
+                               'paid_off_rate', 'recovery_rate_defaulters']].round(4)
+
+
+def main(engine=None):
+    """Folds rows after the last processed date into the cohort tables and rewrites the curves."""
+    if engine is None:
+        engine = connect_or_exit("vintage analytics")
+
+    loans, cells = load_state()
+    watermark = pd.to_datetime(loans['last_date']).max() if len(loans) else None
+
+    # Only rows after the last processed date are read
+    query = (
+        f"SELECT loan_id, customer_id, `date`, loan_amount, cumulative_repayment, outstanding_balance, days_in_arrears "
+        f"FROM {SOURCE_TABLE}"
+    )
+    params = {}
+    if watermark is not None:
+        query += " WHERE `date` > :watermark"
+        params['watermark'] = watermark.to_pydatetime()
+    df_new = pd.read_sql(text(query), engine, params=params)
+
+    if df_new.empty:
+        print(f"Vintage tables are up to date (last date: {watermark.date() if watermark is not None else 'n/a'}).")
+    else:
+        loans, cells, touched = apply_new_rows(df_new, loans, cells)
+        loans.to_csv(LOAN_STATE_FILE, index=False)
+        cells.to_csv(CELLS_FILE, index=False)
+        print(f"Processed {len(df_new)} new rows; updated {len(touched)} cohort x months-on-book cell(s).")
+
+    df_curves = vintage_curves(loans, cells)
+    df_curves.to_csv(CURVES_FILE, index=False)
+    print(f"Vintage curves saved to: {CURVES_FILE}")
+    print(df_curves)
+
+
+if __name__ == "__main__":
+    main()
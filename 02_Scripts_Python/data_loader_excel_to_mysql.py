@@ -1,72 +1,186 @@
 import pandas as pd
-from sqlalchemy import create_engine
+import numpy as np
+import time
+from sqlalchemy import text, DateTime, Float, String
 import mysql.connector
-from dotenv import load_dotenv 
-import os 
-from urllib.parse import quote_plus
-
-# --- Load environment variables from .env file ---
-load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
-
-# --- 1. Database Connection Details (NOW LOADED SECURELY) ---
-MYSQL_USER = os.getenv('MYSQL_USER')
-MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD')
-MYSQL_HOST = os.getenv('MYSQL_HOST')
-MYSQL_DATABASE = os.getenv('MYSQL_DATABASE') 
-
-# --- 2. Read the Excel File into a DataFrame ---
-
-# FIX 1: Define the path relative to the project root (where the pipeline runs from)
-INPUT_DIR = '01_Data_Input'
-EXCEL_FILE_NAME = 'Loan_Snapshot_Interview_Dataset.xlsx'
-
-# Construct the path relative to the current working directory (project root)
-excel_file_path = os.path.join(INPUT_DIR, EXCEL_FILE_NAME)
-
-try:
-    print(f"Attempting to load data from: {os.path.join(os.getcwd(), excel_file_path)}")
-    df = pd.read_excel(excel_file_path)
-    print(f"Read {len(df)} rows from Excel.")
-except FileNotFoundError:
-    print(f"ERROR: Excel file not found at {excel_file_path}. Please verify the file is in the 01_Data_Input folder.")
-    exit()
-
-
-# --- 3. Clean Column Names for SQL ---
-# Rename the column with the special character
-df.rename(columns={'utilization (%)': 'utilization_pct'}, inplace=True)
-
-# --- 4. Establish SQL Connection (using SQLAlchemy) ---
-# Check for credentials before attempting connection
-if not all([MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST, MYSQL_DATABASE]):
-    print("ERROR: Database credentials missing or incomplete. Check your .env file.")
-    exit()
-
-# 4.1 URL ENCODE THE PASSWORD to handle special characters (like @ or !)
-ENCODED_PASSWORD = quote_plus(MYSQL_PASSWORD)
-
-# 4.2 Construct the URL using the ENCODED password
-mysql_url = (
-    f'mysql+mysqlconnector://{MYSQL_USER}:{ENCODED_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}'
-)
-
-try:
-    engine = create_engine(mysql_url)
-    print("Attempting to connect to MySQL...")
-    
-    # --- 5. Load the DataFrame into MySQL ---
-    # FIX 2: Use lowercase table name to prevent MySQL case sensitivity errors.
-    df.to_sql(
-        name='loansnapshot', 
-        con=engine, 
-        if_exists='replace', 
-        index=False
+import os
+
+# --- 1. Database Connection Details (loaded from .env by db_connection) ---
+from db_connection import connect_or_exit, MYSQL_DATABASE
+
+# --- Validation Configuration ---
+TARGET_TABLE = 'loansnapshot'
+QUARANTINE_TABLE = 'loansnapshot_quarantine'
+CHUNK_ROWS = 50_000                 # Rows validated and loaded per chunk
+VALIDATION_OVERHEAD_BUDGET = 0.10   # Validation may add at most 10% to ingestion time
+
+# Declared schema: column -> (type, nullable)
+SCHEMA = {
+    'date': ('datetime', False),
+    'customer_id': ('string', False),
+    'loan_id': ('string', False),
+    'loan_amount': ('numeric', False),
+    'cumulative_repayment': ('numeric', True),
+    'cumulative_interest': ('numeric', True),
+    'cumulative_paid': ('numeric', True),
+    'outstanding_balance': ('numeric', True),
+    'days_in_arrears': ('numeric', True),
+    'status': ('string', True),
+    'utilization_pct': ('numeric', True),
+    'DPD_bucket': ('string', True),
+    'risk_band': ('string', True),
+}
+# Column types of the target table (VARCHAR so (customer_id, date) can be indexed)
+SQL_TYPES = {'datetime': DateTime(), 'string': String(64), 'numeric': Float(precision=53)}
+
+
+def coerce_types(df):
+    """Casts columns to their declared types; values that fail to parse become NaN/NaT."""
+    df = df.copy()
+    for col, (col_type, _) in SCHEMA.items():
+        if col_type == 'numeric':
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        elif col_type == 'datetime':
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    return df
+
+
+def create_target_table(engine, df):
+    """Replaces the target table with the declared column types, before any chunk is appended."""
+    df.iloc[:0].to_sql(
+        name=TARGET_TABLE,
+        con=engine,
+        if_exists='replace',
+        index=False,
+        dtype={col: SQL_TYPES[col_type] for col, (col_type, _) in SCHEMA.items()}
     )
-    
-    print("--------------------------------------------------------")
-    print(f"SUCCESS: Data loaded into the 'loansnapshot' table in {MYSQL_DATABASE}!")
-
-except Exception as e:
-    print("--------------------------------------------------------")
-    print(f"FATAL ERROR: Could not load data into MySQL.")
-    print(f"Details: {e}")
\ No newline at end of file
+    # Readers (e.g. Arrears_Roll_Rates.py) page through the panel in (customer_id, date) order
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE INDEX ix_{TARGET_TABLE}_customer_date ON {TARGET_TABLE} (customer_id, `date`)"))
+
+
+def validate_chunk(raw, df, previous_key):
+    """
+    Vectorized schema and business-rule checks on one (customer_id, date)-sorted chunk.
+    raw is the chunk as read, df the type-coerced chunk, and previous_key the last row of
+    the previous chunk (customer_id, date, cumulative_repayment), so ordering rules hold
+    across chunk boundaries. Returns one '|'-joined reason string per row ('' = valid).
+    """
+    checks = {}
+    for col, (col_type, nullable) in SCHEMA.items():
+        if col_type != 'string':
+            checks[f'INVALID_TYPE_{col.upper()}'] = raw[col].notna().to_numpy() & df[col].isna().to_numpy()
+        if not nullable:
+            checks[f'MISSING_{col.upper()}'] = raw[col].isna().to_numpy()
+
+    checks['NON_POSITIVE_LOAN_AMOUNT'] = (df['loan_amount'] <= 0).to_numpy()
+    checks['NEGATIVE_OUTSTANDING_BALANCE'] = (df['outstanding_balance'] < 0).to_numpy()
+    checks['NEGATIVE_DAYS_IN_ARREARS'] = (df['days_in_arrears'] < 0).to_numpy()
+    checks['UTILIZATION_OUT_OF_RANGE'] = ((df['utilization_pct'] < 0) | (df['utilization_pct'] > 100)).to_numpy()
+
+    # Ordering rules compare each row with the row before it (prepended from the previous chunk)
+    prev_customer = np.concatenate([[previous_key[0]], df['customer_id'].to_numpy()[:-1]])
+    prev_date = np.concatenate([[previous_key[1]], df['date'].to_numpy()[:-1]]).astype('datetime64[ns]')
+    prev_repayment = np.concatenate([[previous_key[2]], df['cumulative_repayment'].to_numpy()[:-1]]).astype(float)
+    same_customer = df['customer_id'].to_numpy() == prev_customer
+
+    checks['DUPLICATE_CUSTOMER_DATE'] = same_customer & (df['date'].to_numpy() == prev_date)
+    checks['NON_MONOTONIC_CUMULATIVE_REPAYMENT'] = same_customer & (df['cumulative_repayment'].to_numpy() < prev_repayment)
+
+    reasons = pd.Series('', index=df.index)
+    for code, failed in checks.items():
+        if failed.any():
+            reasons[failed] = reasons[failed] + '|' + code
+    return reasons.str.lstrip('|')
+
+
+def main(engine=None):
+    """Validates the Excel extract chunk by chunk and loads it into MySQL."""
+    # --- 2. Read the Excel File into a DataFrame ---
+
+    # FIX 1: Define the path relative to the project root (where the pipeline runs from)
+    INPUT_DIR = '01_Data_Input'
+    EXCEL_FILE_NAME = 'Loan_Snapshot_Interview_Dataset.xlsx'
+
+    # Construct the path relative to the current working directory (project root)
+    excel_file_path = os.path.join(INPUT_DIR, EXCEL_FILE_NAME)
+
+    try:
+        print(f"Attempting to load data from: {os.path.join(os.getcwd(), excel_file_path)}")
+        df = pd.read_excel(excel_file_path)
+        print(f"Read {len(df)} rows from Excel.")
+    except FileNotFoundError:
+        print(f"ERROR: Excel file not found at {excel_file_path}. Please verify the file is in the 01_Data_Input folder.")
+        exit()
+
+
+    # --- 3. Clean Column Names for SQL ---
+    # Rename the column with the special character
+    df.rename(columns={'utilization (%)': 'utilization_pct'}, inplace=True)
+
+    missing_columns = [col for col in SCHEMA if col not in df.columns]
+    if missing_columns:
+        print(f"ERROR: Input file does not match the declared schema. Missing columns: {missing_columns}")
+        exit()
+
+    # One sort so duplicate and monotonicity checks only compare adjacent rows
+    df = df.sort_values(['customer_id', 'date'], kind='stable', ignore_index=True)
+
+    # --- 4. Establish SQL Connection (using SQLAlchemy) ---
+    if engine is None:
+        engine = connect_or_exit("data ingestion")
+
+    try:
+        print("Attempting to connect to MySQL...")
+
+        # --- 5. Validate and Load the DataFrame into MySQL, chunk by chunk ---
+        validation_seconds = 0.0
+        total_start = time.perf_counter()
+        previous_key = (None, np.datetime64('NaT'), np.nan)
+        loaded_rows = quarantined_rows = 0
+        ingested_at = pd.Timestamp.now().floor('s')
+
+        # FIX 2: Use lowercase table name to prevent MySQL case sensitivity errors.
+        create_target_table(engine, df)
+
+        for start in range(0, len(df), CHUNK_ROWS):
+            raw = df.iloc[start:start + CHUNK_ROWS]
+
+            validation_start = time.perf_counter()
+            chunk = coerce_types(raw)
+            reasons = validate_chunk(raw, chunk, previous_key)
+            valid = (reasons == '').to_numpy()
+            last = chunk.iloc[-1]
+            previous_key = (last['customer_id'], last['date'], last['cumulative_repayment'])
+            validation_seconds += time.perf_counter() - validation_start
+
+            chunk[valid].to_sql(name=TARGET_TABLE, con=engine, if_exists='append', index=False)
+            if not valid.all():
+                # Rejected rows keep their raw values so the source problem stays visible (missing stays NULL)
+                rejected = raw[~valid]
+                rejected.astype(str).where(rejected.notna()).assign(reason_codes=reasons[~valid], ingested_at=ingested_at).to_sql(
+                    name=QUARANTINE_TABLE, con=engine, if_exists='append', index=False
+                )
+            loaded_rows += int(valid.sum())
+            quarantined_rows += int((~valid).sum())
+
+        total_seconds = time.perf_counter() - total_start
+        overhead = validation_seconds / max(total_seconds - validation_seconds, 1e-9)
+
+        print("--------------------------------------------------------")
+        print(f"SUCCESS: {loaded_rows} rows loaded into the '{TARGET_TABLE}' table in {MYSQL_DATABASE}!")
+        if quarantined_rows:
+            print(f"WARNING: {quarantined_rows} rows failed validation and were written to '{QUARANTINE_TABLE}'.")
+        print(f"Validation overhead: {overhead:.1%} of ingestion time (budget {VALIDATION_OVERHEAD_BUDGET:.0%}).")
+        if overhead > VALIDATION_OVERHEAD_BUDGET:
+            print("WARNING: Validation exceeded its overhead budget; consider a larger CHUNK_ROWS.")
+
+    except Exception as e:
+        print("--------------------------------------------------------")
+        print(f"FATAL ERROR: Could not load data into MySQL.")
+        print(f"Details: {e}")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import os
+from sqlalchemy import create_engine
+from dotenv import load_dotenv
+from urllib.parse import quote_plus
+
+# --- Configuration & Setup ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+load_dotenv(os.path.join(PROJECT_ROOT, '.env'))
+
+# MySQL connection details (shared by every script that reads or writes the database)
+MYSQL_USER = os.getenv('MYSQL_USER')
+MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD')
+MYSQL_HOST = os.getenv('MYSQL_HOST')
+MYSQL_DATABASE = os.getenv('MYSQL_DATABASE')
+
+
+def create_db_engine(**engine_options):
+    """Builds the SQLAlchemy engine from the .env credentials (options go to create_engine)."""
+    # URL-encode the password to handle special characters (like @ or !)
+    mysql_url = (
+        f'mysql+mysqlconnector://{MYSQL_USER}:{quote_plus(MYSQL_PASSWORD)}@{MYSQL_HOST}/{MYSQL_DATABASE}'
+    )
+    return create_engine(mysql_url, **engine_options)
+
+
+def connect_or_exit(purpose):
+    """Engine for a script run on its own; exits with an error if the credentials are unusable."""
+    if not all([MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST, MYSQL_DATABASE]):
+        print("ERROR: Database credentials missing or incomplete. Check your .env file.")
+        exit(1)
+    try:
+        engine = create_db_engine()
+        print(f"Connection established for {purpose}.")
+    except Exception as e:
+        print(f"FATAL ERROR: Could not connect to MySQL: {e}")
+        exit(1)
+    return engine
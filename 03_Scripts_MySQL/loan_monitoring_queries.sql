@@ -1,5 +1,30 @@
 -- SQL Query for Executive Credit Portfolio Monitoring Dashboard
 
+-- ====================================================================
+-- Table Definition: CreditPortfolioMonitor (Date-Partitioned History)
+-- ====================================================================
+-- Created and maintained by ETL_Portfolio_Setup.py. One row per customer per
+-- snapshot_date, one RANGE partition per month (p_future catches new dates until
+-- the ETL splits it). Expired months are removed with ALTER TABLE ... DROP PARTITION.
+CREATE TABLE IF NOT EXISTS CreditPortfolioMonitor (
+    snapshot_date DATE NOT NULL,
+    customer_id VARCHAR(20) NOT NULL,
+    credit_score INT,
+    actual_default INT,
+    risk_segment VARCHAR(20),
+    recommended_limit INT,
+    loan_status VARCHAR(20),
+    days_past_due INT,
+    outstanding_balance DECIMAL(10, 2),
+    expected_profit_loss DECIMAL(10, 2),
+    PRIMARY KEY (snapshot_date, customer_id),
+    KEY idx_risk_segment (snapshot_date, risk_segment),
+    KEY idx_loan_status (snapshot_date, loan_status)
+)
+PARTITION BY RANGE (TO_DAYS(snapshot_date)) (
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
+
 -- Objective: Calculate key risk and exposure metrics broken down by the 
 -- Machine Learning-driven Risk Segment.
 SELECT
@@ -17,5 +42,9 @@ SELECT
     AVG(expected_profit_loss) AS avg_expected_pnl_per_customer
 FROM
     CreditPortfolioMonitor
+WHERE
+    -- Latest snapshot only. MySQL does not prune partitions on a subquery result, so this scans
+    -- every partition; substitute the literal date (as Viz_Dashboard_KPIs.py binds it) to read one.
+    snapshot_date = (SELECT MAX(snapshot_date) FROM CreditPortfolioMonitor)
 GROUP BY 1
 ORDER BY portfolio_default_rate_pct DESC;
\ No newline at end of file
@@ -94,6 +94,8 @@ WHERE
 -- 6. Trend Question: Day-by-Day Change in Cumulative Paid (e.g., Daily Repayment)
 -- ====================================================================
 -- Shows daily repayment activity for a specific customer ('C001' is an example)
+-- For any (or every) customer without rerunning the window function, use the
+-- precomputed time-series store: 02_Scripts_Python/Repayment_TimeSeries_Store.py
 SELECT
     `date`,
     cumulative_paid,
@@ -1,43 +1,24 @@
 import pandas as pd
 import os
-from sqlalchemy import create_engine
-from dotenv import load_dotenv
-from urllib.parse import quote_plus
-import matplotlib.pyplot as plt
-import seaborn as sns
-import matplotlib
-
-# Set Matplotlib backend to save files without a display environment
-matplotlib.use('Agg')
+import sys
+from sqlalchemy import text
 
 # --- Configuration & Setup ---
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-load_dotenv(os.path.join(PROJECT_ROOT, '.env'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, '02_Scripts_Python'))
+from db_connection import connect_or_exit
 
 MODEL_OUTPUT_PATH = '04_Analysis_Outputs/'
 DASHBOARD_VIS_FILENAME = "06_Credit_Portfolio_Dashboard.png"
 DB_TABLE = 'CreditPortfolioMonitor'
-
-# MySQL connection details
-MYSQL_USER = os.getenv('MYSQL_USER')
-MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD')
-MYSQL_HOST = os.getenv('MYSQL_HOST')
-MYSQL_DATABASE = os.getenv('MYSQL_DATABASE')
-ENCODED_PASSWORD = quote_plus(MYSQL_PASSWORD)
-
-mysql_url = (
-    f'mysql+mysqlconnector://{MYSQL_USER}:{ENCODED_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}'
-)
-
-try:
-    engine = create_engine(mysql_url)
-    print("Connection established for dashboard data pull.")
-except Exception as e:
-    print(f"FATAL ERROR: Could not connect to MySQL: {e}")
-    exit()
+# Written by Score_Quantile_Sketch.py from the merged score sketches of all scoring batches
+SCORE_PERCENTILE_FILE = os.path.join(MODEL_OUTPUT_PATH, "Score_Percentiles_By_Segment.csv")
 
 # --- 1. Define the SQL Monitoring Query ---
-# Note: This query calculates KPIs per segment
+# Note: This query calculates KPIs per segment on the latest snapshot only.
+# MySQL cannot prune partitions on a subquery result, so the latest date is resolved first
+# (from the primary key) and bound as a constant, which prunes the scan to one partition.
+LATEST_SNAPSHOT_QUERY = f"SELECT MAX(snapshot_date) FROM {DB_TABLE}"
 MONITORING_QUERY = f"""
 SELECT
     risk_segment,
@@ -47,81 +28,109 @@ SELECT
     AVG(expected_profit_loss) AS avg_expected_pnl_per_customer
 FROM
     {DB_TABLE}
+WHERE
+    snapshot_date = :snapshot_date
 GROUP BY 1
 ORDER BY portfolio_default_rate_pct DESC;
 """
 
-# --- 2. Data Pull and Preparation ---
-try:
-    df_dashboard = pd.read_sql(MONITORING_QUERY, engine)
-    
-    # Sort for cleaner visualization (e.g., Prime -> High-Risk)
-    risk_order = ['Prime', 'Good', 'Average', 'High-Risk']
-    df_dashboard['risk_segment'] = pd.Categorical(df_dashboard['risk_segment'], categories=risk_order, ordered=True)
-    df_dashboard = df_dashboard.sort_values('risk_segment')
-    
-except Exception as e:
-    print(f"ERROR: Could not pull monitoring data from MySQL: {e}")
-    exit()
-
-# --- 3. Visualization: Executive Dashboard (3 KPIs) ---
-
-fig, axes = plt.subplots(1, 3, figsize=(18, 6))
-sns.set_style("whitegrid")
-segment_colors = sns.color_palette("viridis", n_colors=len(df_dashboard))
-
-# --- Plot 1: Portfolio Default Rate (%) ---
-sns.barplot(
-    ax=axes[0], 
-    x='risk_segment', 
-    y='portfolio_default_rate_pct', 
-    data=df_dashboard, 
-    palette=segment_colors
-)
-axes[0].set_title('KPI 1: Default Rate by Segment (%)', fontsize=14)
-axes[0].set_ylabel('Default Rate (%)', fontsize=12)
-axes[0].set_xlabel('ML Segment', fontsize=12)
-axes[0].tick_params(axis='x', rotation=15)
-axes[0].yaxis.set_major_formatter(matplotlib.ticker.PercentFormatter())
-
-
-# --- Plot 2: Total Outstanding Exposure ---
-sns.barplot(
-    ax=axes[1], 
-    x='risk_segment', 
-    y='total_outstanding_exposure', 
-    data=df_dashboard, 
-    palette=segment_colors
-)
-axes[1].set_title('KPI 2: Total Exposure by Segment ($)', fontsize=14)
-axes[1].set_ylabel('Total Outstanding Exposure', fontsize=12)
-axes[1].set_xlabel('ML Segment', fontsize=12)
-axes[1].tick_params(axis='x', rotation=15)
-axes[1].ticklabel_format(style='plain', axis='y') # Use plain numbers for currency
-
-# --- Plot 3: Average Expected Profitability ---
-sns.barplot(
-    ax=axes[2], 
-    x='risk_segment', 
-    y='avg_expected_pnl_per_customer', 
-    data=df_dashboard, 
-    palette=segment_colors
-)
-axes[2].set_title('KPI 3: Avg Expected P&L per Customer ($)', fontsize=14)
-axes[2].set_ylabel('Avg Expected P&L', fontsize=12)
-axes[2].set_xlabel('ML Segment', fontsize=12)
-axes[2].tick_params(axis='x', rotation=15)
-
-
-fig.suptitle('Executive Credit Portfolio Health Check (Driven by ML Segmentation)', fontsize=18, weight='bold', y=1.02)
-plt.tight_layout(rect=[0, 0, 1, 0.98])
-
-# Save the figure
-file_path = os.path.join(MODEL_OUTPUT_PATH, DASHBOARD_VIS_FILENAME)
-plt.savefig(file_path)
-plt.close()
-
-print("\n--- Project 3 Complete ---")
-print(f"Executive Portfolio Dashboard saved to: {file_path}")
-print("\nFinal Portfolio Health Check Data:")
-print(df_dashboard)
\ No newline at end of file
+
+def main(engine=None):
+    """Pulls the latest snapshot's KPIs per segment and draws the executive dashboard."""
+    if engine is None:
+        engine = connect_or_exit("dashboard data pull")
+
+    # --- 2. Data Pull and Preparation ---
+    try:
+        with engine.connect() as conn:
+            latest_snapshot = conn.execute(text(LATEST_SNAPSHOT_QUERY)).scalar()
+            df_dashboard = pd.read_sql(text(MONITORING_QUERY), conn, params={'snapshot_date': latest_snapshot})
+
+        # Sort for cleaner visualization (e.g., Prime -> High-Risk)
+        risk_order = ['Prime', 'Good', 'Average', 'High-Risk']
+        df_dashboard['risk_segment'] = pd.Categorical(df_dashboard['risk_segment'], categories=risk_order, ordered=True)
+        df_dashboard = df_dashboard.sort_values('risk_segment')
+
+    except Exception as e:
+        print(f"ERROR: Could not pull monitoring data from MySQL: {e}")
+        exit()
+
+    # Score distribution per segment comes from the sketches, not from the full scoring output
+    if os.path.exists(SCORE_PERCENTILE_FILE):
+        df_percentiles = pd.read_csv(SCORE_PERCENTILE_FILE, usecols=['risk_segment', 'p10', 'p50', 'p90'])
+        df_dashboard = df_dashboard.merge(
+            df_percentiles.rename(columns=lambda col: f'score_{col}' if col != 'risk_segment' else col),
+            on='risk_segment', how='left'
+        )
+
+    # --- 3. Visualization: Executive Dashboard (3 KPIs) ---
+    # Plotting is only loaded once the data pull has succeeded
+    import matplotlib
+    # Set Matplotlib backend to save files without a display environment
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, axes = plt.subplots(1, 3, figsize=(18, 6))
+    sns.set_style("whitegrid")
+    segment_colors = sns.color_palette("viridis", n_colors=len(df_dashboard))
+
+    # --- Plot 1: Portfolio Default Rate (%) ---
+    sns.barplot(
+        ax=axes[0], 
+        x='risk_segment', 
+        y='portfolio_default_rate_pct', 
+        data=df_dashboard, 
+        palette=segment_colors
+    )
+    axes[0].set_title('KPI 1: Default Rate by Segment (%)', fontsize=14)
+    axes[0].set_ylabel('Default Rate (%)', fontsize=12)
+    axes[0].set_xlabel('ML Segment', fontsize=12)
+    axes[0].tick_params(axis='x', rotation=15)
+    axes[0].yaxis.set_major_formatter(matplotlib.ticker.PercentFormatter())
+
+
+    # --- Plot 2: Total Outstanding Exposure ---
+    sns.barplot(
+        ax=axes[1], 
+        x='risk_segment', 
+        y='total_outstanding_exposure', 
+        data=df_dashboard, 
+        palette=segment_colors
+    )
+    axes[1].set_title('KPI 2: Total Exposure by Segment ($)', fontsize=14)
+    axes[1].set_ylabel('Total Outstanding Exposure', fontsize=12)
+    axes[1].set_xlabel('ML Segment', fontsize=12)
+    axes[1].tick_params(axis='x', rotation=15)
+    axes[1].ticklabel_format(style='plain', axis='y') # Use plain numbers for currency
+
+    # --- Plot 3: Average Expected Profitability ---
+    sns.barplot(
+        ax=axes[2], 
+        x='risk_segment', 
+        y='avg_expected_pnl_per_customer', 
+        data=df_dashboard, 
+        palette=segment_colors
+    )
+    axes[2].set_title('KPI 3: Avg Expected P&L per Customer ($)', fontsize=14)
+    axes[2].set_ylabel('Avg Expected P&L', fontsize=12)
+    axes[2].set_xlabel('ML Segment', fontsize=12)
+    axes[2].tick_params(axis='x', rotation=15)
+
+
+    fig.suptitle('Executive Credit Portfolio Health Check (Driven by ML Segmentation)', fontsize=18, weight='bold', y=1.02)
+    plt.tight_layout(rect=[0, 0, 1, 0.98])
+
+    # Save the figure
+    file_path = os.path.join(MODEL_OUTPUT_PATH, DASHBOARD_VIS_FILENAME)
+    plt.savefig(file_path)
+    plt.close()
+
+    print("\n--- Project 3 Complete ---")
+    print(f"Executive Portfolio Dashboard saved to: {file_path}")
+    print("\nFinal Portfolio Health Check Data:")
+    print(df_dashboard)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,6 @@
 import pandas as pd
-from sqlalchemy import create_engine
-from dotenv import load_dotenv
 import os
-from urllib.parse import quote_plus
-import matplotlib.pyplot as plt
-import seaborn as sns
-import matplotlib
-
-# Set Matplotlib backend to save files without a display environment
-matplotlib.use('Agg')
+import sys
 
 # --- 1. Setup & Connection ---
 
@@ -17,28 +9,13 @@ matplotlib.use('Agg')
 # and then up a second level (Kuda_Loan_Analysis_Project).
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-# Load environment variables from the project root. This is secure.
-load_dotenv(os.path.join(PROJECT_ROOT, '.env'))
-
-MYSQL_USER = os.getenv('MYSQL_USER')
-MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD')
-MYSQL_HOST = os.getenv('MYSQL_HOST')
-MYSQL_DATABASE = os.getenv('MYSQL_DATABASE')
-ENCODED_PASSWORD = quote_plus(MYSQL_PASSWORD)
+# The engine helper (credentials from the project's .env) lives with the pipeline scripts
+sys.path.insert(0, os.path.join(PROJECT_ROOT, '02_Scripts_Python'))
+from db_connection import connect_or_exit
 
 # Construct the full output path
 OUTPUT_DIR = os.path.join(PROJECT_ROOT, '04_Analysis_Outputs')
-
-mysql_url = (
-    f'mysql+mysqlconnector://{MYSQL_USER}:{ENCODED_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}'
-)
-
-try:
-    engine = create_engine(mysql_url)
-    print("Connection established for visualization data pull.")
-except Exception as e:
-    print(f"FATAL ERROR: Could not connect to MySQL: {e}")
-    exit()
+VINTAGE_CURVES_FILE = os.path.join(OUTPUT_DIR, 'Vintage_Curves.csv')
 
 # --- 2. Data Pull: Max Arrears (for Histogram) ---
 
@@ -52,19 +29,32 @@ FROM
 GROUP BY
     customer_id;
 """
-df_arrears = pd.read_sql(arrears_query, engine)
 
 # --- 3. Data Pull: Outstanding Balance Trend (for Cohort Analysis) ---
 
 # Query pulls all daily data for a visualization of the trend
 trend_query = "SELECT `date`, outstanding_balance FROM LoanSnapshot ORDER BY `date`;"
-df_trend = pd.read_sql(trend_query, engine)
-df_trend['date'] = pd.to_datetime(df_trend['date']).dt.date
+
+
+def load_trend(engine):
+    df_trend = pd.read_sql(trend_query, engine)
+    df_trend['date'] = pd.to_datetime(df_trend['date']).dt.date
+    return df_trend
 
 # --- 4. Visualization Functions ---
 
+def _plotting():
+    """Imports matplotlib and seaborn on first use, so importing this module stays cheap."""
+    import matplotlib
+    # Set Matplotlib backend to save files without a display environment
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    return matplotlib, plt, sns
+
 def create_arrears_histogram(df):
     """Generates a histogram of maximum days in arrears."""
+    matplotlib, plt, sns = _plotting()
     plt.figure(figsize=(10, 6))
     sns.histplot(df['max_days_in_arrears'], bins=range(int(df['max_days_in_arrears'].max()) + 2), kde=False, color='darkred', edgecolor='black')
     
@@ -83,6 +73,7 @@ def create_outstanding_balance_trend(df):
     """Generates a time series chart for the average outstanding balance."""
     # Calculate the average outstanding balance per date
     df_daily_avg = df.groupby('date')['outstanding_balance'].mean().reset_index()
+    matplotlib, plt, sns = _plotting()
     
     plt.figure(figsize=(12, 6))
     sns.lineplot(x='date', y='outstanding_balance', data=df_daily_avg, color='darkgreen', linewidth=2)
@@ -99,10 +90,44 @@ def create_outstanding_balance_trend(df):
     plt.close()
     print(f"Saved: {file_path}")
 
+def create_vintage_curves(df):
+    """Generates cumulative default and paid-off curves by origination cohort (months on book)."""
+    matplotlib, plt, sns = _plotting()
+    fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+    for ax, metric, title in [
+        (axes[0], 'cumulative_default_rate', 'Cumulative Default Rate by Vintage'),
+        (axes[1], 'paid_off_rate', 'Paid-Off Rate by Vintage'),
+    ]:
+        sns.lineplot(ax=ax, x='months_on_book', y=metric, hue='cohort', data=df, marker='o', linewidth=2)
+        ax.set_title(title, fontsize=14)
+        ax.set_xlabel('Months on Book', fontsize=12)
+        ax.set_ylabel('Share of Loans', fontsize=12)
+        ax.set_xticks(sorted(df['months_on_book'].unique()))
+        ax.yaxis.set_major_formatter(matplotlib.ticker.PercentFormatter(xmax=1))
+        ax.grid(True, linestyle='--', alpha=0.6)
+        ax.legend(title='Origination Cohort')
+    plt.tight_layout()
+
+    file_path = os.path.join(OUTPUT_DIR, '07_Vintage_Curves.png')
+    plt.savefig(file_path)
+    plt.close()
+    print(f"Saved: {file_path}")
+
 # --- 5. Execution ---
 
-if __name__ == "__main__":
+def main(engine=None):
+    """Draws the arrears histogram, the repayment trend and, once computed, the vintage curves."""
+    if engine is None:
+        engine = connect_or_exit("visualization data pull")
+
     print("--- Starting Visualization Generation ---")
-    create_arrears_histogram(df_arrears)
-    create_outstanding_balance_trend(df_trend)
-    print("--- Visualization Complete ---")
\ No newline at end of file
+    create_arrears_histogram(pd.read_sql(arrears_query, engine))
+    create_outstanding_balance_trend(load_trend(engine))
+    # Vintage curves are precomputed by 02_Scripts_Python/Vintage_Cohort_Engine.py
+    if os.path.exists(VINTAGE_CURVES_FILE):
+        create_vintage_curves(pd.read_csv(VINTAGE_CURVES_FILE))
+    print("--- Visualization Complete ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,37 +2,79 @@
 # Master script for executing the Kuda Loan Analysis data pipeline end-to-end.
 # This script simulates a production scheduler or CI/CD job by running steps sequentially
 # and stopping if any script returns an error.
+#
+# Usage: .\run_pipeline.ps1                      # one cold Python process per step
+#        .\run_pipeline.ps1 -Warm                # all steps in the resident pipeline worker
+#        .\run_pipeline.ps1 -Warm -Stages refresh # intraday refresh: re-score, re-limit, reload, re-report
+
+param(
+    [switch]$Warm,
+    [string[]]$Stages = @("all")
+)
 
 $ErrorActionPreference = "Stop" # Stop the script immediately on error
 $PythonScriptsPath = "02_Scripts_Python"
 $VizScriptsPath = "05_Visualizations_Python"
 
+# Native commands do not trip $ErrorActionPreference, so each step's exit code is checked here
+function Invoke-PythonStep([string]$Script) {
+    python $Script
+    if ($LASTEXITCODE -ne 0) { throw "$Script exited with code $LASTEXITCODE." }
+}
+
 Write-Host "--- Kuda Loan Analysis Pipeline Started ---" -ForegroundColor Yellow
 
 try {
+    # --- WARM MODE: Stages run in Pipeline_Worker.py, which keeps libraries, fitted models and the DB pool loaded ---
+    if ($Warm) {
+        Write-Host "`n[WARM MODE: Running stages '$($Stages -join ', ')' in the pipeline worker]..." -ForegroundColor Magenta
+        python "$PythonScriptsPath\Pipeline_Worker.py" --start
+        python "$PythonScriptsPath\Pipeline_Worker.py" @Stages
+        if ($LASTEXITCODE -ne 0) { throw "The pipeline worker reported a failed stage." }
+
+        Write-Host "`n--- Pipeline Execution Complete (warm worker) ---" -ForegroundColor Green
+        exit 0
+    }
+
     # --- PHASE 0: DATA INGESTION & SQL ANALYSIS ETL ---
     Write-Host "`n[PHASE 0: Data Ingestion & SQL Analysis ETL]..." -ForegroundColor Magenta
     
     # 0.1 DATA INGESTION: Load data from Excel, clean, populate MySQL, and run core feature generation queries.
     Write-Host "  -> Running Data Ingestion, ETL, and Core SQL Analysis..." -ForegroundColor Cyan
-    python "$PythonScriptsPath\data_loader_excel_to_mysql.py"
+    Invoke-PythonStep "$PythonScriptsPath\data_loader_excel_to_mysql.py"
     
-    # 0.2 INITIAL VIZ: Generate initial historical charts (Max Arrears, Repayment Trend).
-    Write-Host "  -> Running Foundational Analysis Visualizations (Max Arrears, Trend)..." -ForegroundColor Cyan
-    python "$VizScriptsPath\Viz_Historical_Analysis.py"
+    # 0.2 ROLL RATES: Append the newest periods to the arrears transition counts and refresh the roll-rate matrices.
+    Write-Host "  -> Running Arrears Roll-Rate Engine (Transition Matrices)..." -ForegroundColor Cyan
+    Invoke-PythonStep "$PythonScriptsPath\Arrears_Roll_Rates.py"
+
+    # 0.3 TIME-SERIES STORE: Append the newest days to the per-customer repayment store (daily repayment deltas).
+    Write-Host "  -> Updating Per-Customer Repayment Time-Series Store..." -ForegroundColor Cyan
+    Invoke-PythonStep "$PythonScriptsPath\Repayment_TimeSeries_Store.py"
+
+    # 0.4 VINTAGES: Fold the newest days into the cohort x months-on-book tables and refresh the vintage curves.
+    Write-Host "  -> Running Vintage/Cohort Performance Engine..." -ForegroundColor Cyan
+    Invoke-PythonStep "$PythonScriptsPath\Vintage_Cohort_Engine.py"
+
+    # 0.5 INITIAL VIZ: Generate initial historical charts (Max Arrears, Repayment Trend, Vintage Curves).
+    Write-Host "  -> Running Foundational Analysis Visualizations (Max Arrears, Trend, Vintages)..." -ForegroundColor Cyan
+    Invoke-PythonStep "$VizScriptsPath\Viz_Historical_Analysis.py"
     
     # --- PHASE 1: CREDIT SCORING & PROFIT OPTIMIZATION (Project 1) ---
     Write-Host "`n[PHASE 1: Scoring & P&L Optimization]..." -ForegroundColor Magenta
     
+    # 1.0 MODEL SELECTION: Cross-validate feature sets and regularization; the winning configuration feeds step 1.1.
+    Write-Host "  -> Running Cross-Validated Model Selection..." -ForegroundColor Cyan
+    Invoke-PythonStep "$PythonScriptsPath\Model_Selection_CV.py"
+
     # 1.1 MODEL TRAINING: Train the Logistic Regression model, generate scores, and save output.
     # USING YOUR FILE NAME: Model_Training_V2_Scoring.py
     Write-Host "  -> Running Credit Score Generation (Project 1, Step 1)..." -ForegroundColor Cyan
-    python "$PythonScriptsPath\Model_Training_V2_Scoring.py"
+    Invoke-PythonStep "$PythonScriptsPath\Model_Training_V2_Scoring.py"
     
     # 1.2 OPTIMIZATION: Use scores to calculate P&L and determine optimal cut-off.
     # USING YOUR FILE NAME: Cutoff_Optimization.py
     Write-Host "  -> Running Strategic Cut-off Optimization (Project 1, Step 2)..." -ForegroundColor Cyan
-    python "$PythonScriptsPath\Cutoff_Optimization.py"
+    Invoke-PythonStep "$PythonScriptsPath\Cutoff_Optimization.py"
 
     # --- PHASE 2: CREDIT LIMIT STRATEGY (Project 2) ---
     Write-Host "`n[PHASE 2: Limit Recommendation Strategy]..." -ForegroundColor Magenta
@@ -40,7 +82,11 @@ try {
     # 2.1 CLUSTERING: Segment customers using K-Means and recommend limits.
     # USING YOUR FILE NAME: Credit_Limit_Clustering.py
     Write-Host "  -> Running Credit Limit Clustering (Project 2)..." -ForegroundColor Cyan
-    python "$PythonScriptsPath\Credit_Limit_Clustering.py"
+    Invoke-PythonStep "$PythonScriptsPath\Credit_Limit_Clustering.py"
+
+    # 2.2 SCORE SKETCHES: Sketch this batch's score distribution and merge it with earlier batches.
+    Write-Host "  -> Updating Score Quantile Sketches..." -ForegroundColor Cyan
+    Invoke-PythonStep "$PythonScriptsPath\Score_Quantile_Sketch.py"
 
     # --- PHASE 3: PORTFOLIO MONITORING & REPORTING (Project 3) ---
     Write-Host "`n[PHASE 3: Portfolio Monitoring & Reporting]..." -ForegroundColor Magenta
@@ -48,12 +94,12 @@ try {
     # 3.1 ETL LOAD: Merge all outputs and load the final monitoring table to MySQL.
     # USING YOUR FILE NAME: ETL_Portfolio_Setup.py
     Write-Host "  -> Running ETL to Load Monitoring Table to MySQL (Project 3, Step 1)..." -ForegroundColor Cyan
-    python "$PythonScriptsPath\ETL_Portfolio_Setup.py"
+    Invoke-PythonStep "$PythonScriptsPath\ETL_Portfolio_Setup.py"
     
     # 3.2 DASHBOARD: Connect to MySQL, execute the monitoring query, and generate the final dashboard.
     # USING YOUR PATH: 05_Visualizations_Python\Viz_Dashboard_KPIs.py
     Write-Host "  -> Running Executive Dashboard Visualization (Project 3, Step 2)..." -ForegroundColor Cyan
-    python "$VizScriptsPath\Viz_Dashboard_KPIs.py"
+    Invoke-PythonStep "$VizScriptsPath\Viz_Dashboard_KPIs.py"
 
     # Final Success Message
     Write-Host "`n--- Pipeline Execution Complete! ---" -ForegroundColor Green